@@ -4,12 +4,11 @@
 - パフォーマンス改善
 """
 
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 import numpy as np
 import pandas as pd
-import re
 import io
 import os
 import json
@@ -19,7 +18,23 @@ from functools import wraps
 
 # 新しいマネージャーをインポート
 from user_manager import user_manager  # ユーザー管理は既存のままでOK
-from calculation_manager_v3 import calculation_manager_v3
+from calculation_manager_v3 import calculation_manager_v3, ItemEditError
+from pricing_engine import build_price_table, price_items, price_scenarios, prepare_item_df, finalize_result_df
+from price_sheet_manager import price_sheet_manager
+from parallel_pricing import parallel_pricer
+from item_validation import validate_items, serialize_invalid_weights, serialize_issues
+from csv_streaming import (
+    spool_upload, iter_record_chunks, iter_csv_chunks, infer_column_dtypes, iter_priced_chunks, iter_calculated_csv,
+    iter_frames_csv
+)
+from upload_sessions import upload_session_store, PatchError
+from csv_ingest import read_csv_upload, server_timing_header
+from csv_editing import edit_columns, iter_edited_chunks
+from result_cache import result_cache, compute_cache_key
+from response_cache import response_cache, response_cache_key
+from material_resolver import material_resolver
+from batch_processing import BatchInputError, collect_batch_files, edit_batch, calculate_batch
+from keyset_pagination import InvalidCursorError
 
 app = Flask(__name__, static_folder='frontend/dist', static_url_path='')
 CORS(app)
@@ -146,16 +161,26 @@ def save_calculation():
 @app.route('/calculation-history', methods=['GET'])
 @token_required
 def get_calculation_history():
-    """ユーザーの計算履歴一覧を取得（v3対応）"""
+    """ユーザーの計算履歴一覧を取得（v3対応・?cursor= で次ページ、?sort=newest|oldest|name）"""
     try:
         user_id = request.current_user.get('user_id')
         limit = request.args.get('limit', 50, type=int)
         
+        etag = version_etag('history', user_id, calculation_manager_v3.get_user_data_version(user_id))
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+        
         print(f"📋 計算履歴取得開始 v3 - User ID: {user_id}, Limit: {limit}")
-        histories = calculation_manager_v3.get_calculation_history(user_id, limit)
-        print(f"✅ 計算履歴取得完了 v3 - 件数: {len(histories)}")
-        return jsonify({'histories': histories})
+        body = cached_json_body(etag, user_id, None, lambda: calculation_manager_v3.get_calculation_history_page(
+            user_id, limit,
+            cursor_token=request.args.get('cursor'),
+            sort=request.args.get('sort', 'newest')
+        ))
+        return json_body_response(body, etag)
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"❌ 計算履歴取得エラー v3: {e}")
         import traceback
@@ -166,13 +191,22 @@ def get_calculation_history():
 @app.route('/calculation-history/<int:history_id>', methods=['GET'])
 @token_required
 def get_calculation_detail(history_id):
-    """計算履歴の詳細を取得（v3対応）"""
+    """計算履歴の詳細を取得（v3対応・?items=0 でアイテムを含めない）"""
     try:
         user_id = request.current_user.get('user_id')
+        include_items = request.args.get('items', '1') != '0'
+        
+        etag = version_etag('detail', user_id, history_id,
+                            calculation_manager_v3.get_calculation_version(history_id, user_id))
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
         
-        detail = calculation_manager_v3.get_calculation_detail(history_id, user_id)
-        if detail:
-            return jsonify(detail)
+        body = cached_json_body(etag, user_id, history_id, lambda: calculation_manager_v3.get_calculation_detail(
+            history_id, user_id, include_items=include_items
+        ))
+        if body is not None:
+            return json_body_response(body, etag)
         else:
             return jsonify({'error': '計算履歴が見つかりません'}), 404
             
@@ -180,22 +214,40 @@ def get_calculation_detail(history_id):
         print(f"❌ 計算詳細取得エラー v3: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/calculation-history/<int:history_id>/items', methods=['GET'])
+@app.route('/calculation-history/<int:history_id>/items', methods=['GET'])
+@token_required
+def get_calculation_items(history_id):
+    """計算のアイテムをページ単位で取得（?limit=&cursor=&sort=box|price）"""
+    try:
+        user_id = request.current_user.get('user_id')
+
+        etag = version_etag('items', user_id, history_id,
+                            calculation_manager_v3.get_calculation_version(history_id, user_id))
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+
+        body = cached_json_body(etag, user_id, history_id, lambda: calculation_manager_v3.get_calculation_items_page(
+            history_id, user_id,
+            limit=request.args.get('limit', 500, type=int),
+            cursor_token=request.args.get('cursor'),
+            sort=request.args.get('sort', 'box')
+        ))
+        if body is None:
+            return jsonify({'error': '計算履歴が見つかりません'}), 404
+        return json_body_response(body, etag)
+
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ アイテム一覧取得エラー v3: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # =====================================
 # ヘルパー関数
 # =====================================
 
-def load_material_aliases(json_path="material_price_map.json"):
-    """素材価格マップからエイリアス辞書を作成"""
-    with open(json_path, encoding='utf-8') as f:
-        raw = json.load(f)
-    alias_to_main = {}
-    for main, aliases in raw.items():
-        for alias in aliases:
-            alias_to_main[alias.lower()] = main.lower()
-    return alias_to_main
-
-material_aliases = load_material_aliases()
-
 def ensure_required_columns(df, required_columns):
     """必要なカラムが存在しない場合は None で追加"""
     for col in required_columns:
@@ -204,62 +256,115 @@ def ensure_required_columns(df, required_columns):
     return df
 
 def calculate_items(item_df, price_df):
-    """アイテムの価格計算を実行"""
-    price_df['price'] = pd.to_numeric(price_df['price'], errors='coerce').fillna(0)
-    price_dict_raw = dict(zip(price_df['material'].str.lower(), price_df['price']))
-
-    # エイリアス展開
-    price_dict = {}
-    for alias, main in material_aliases.items():
-        if main in price_dict_raw:
-            price_dict[alias] = price_dict_raw[main]
-
-    def calculate(row):
-        try:
-            raw = str(row['weight']).split('g')[0]
-            cleaned = re.sub(r'[^0-9.]', '', raw)
-            total_weight = float(cleaned) if cleaned else 0.0
-        except Exception:
-            total_weight = 0.0
-
-        gemstone_weight = 0.0
-        material_price = 0.0
-        parts = str(row['misc']).split() if pd.notna(row['misc']) else []
-        material_field = str(row['material']).strip().lower() if pd.notna(row['material']) else ""
-
-        if "/" in material_field:
-            sub_materials = material_field.split("/")
-            prices = [price_dict.get(m.strip()) for m in sub_materials]
-            valid_prices = [p for p in prices if p is not None]
-            material_price = np.mean(valid_prices) if len(valid_prices) == len(sub_materials) else 0
-        else:
-            material_price = price_dict.get(material_field, 0)
-
-        for part in parts:
-            if any(x in part for x in ['#', 'cm', '%']):
-                continue
-            matches = re.findall(r'(\d+(?:\.\d+)?)', part)
-            if matches:
-                num = float(matches[0])
-                if 'mm' in part:
-                    gemstone_weight += num ** 3 / 700
-                elif '.' in part:
-                    gemstone_weight += num * 0.2
-
-        material_weight = total_weight - gemstone_weight
-        material_value = material_weight * material_price
-
-        return pd.Series([
-            material_value, material_price, total_weight,
-            gemstone_weight, material_weight
-        ])
-
-    # 計算実行
-    result_df = item_df.copy()
-    calculations = item_df.apply(calculate, axis=1)
-    result_df[['jewelry_price', 'material_price', 'total_weight', 'gemstone_weight', 'material_weight']] = calculations
-
-    return result_df
+    """アイテムの価格計算を実行（列指向エンジンに委譲）"""
+    price_table = build_price_table(price_df)
+    return price_items(item_df, price_table)
+
+def resolve_price_table(data):
+    """リクエストから単価辞書を取得（price_sheet_id があれば保存済み相場表を優先）"""
+    price_sheet_id = data.get('price_sheet_id')
+    if price_sheet_id:
+        return price_sheet_manager.get_price_table(price_sheet_id, request.current_user.get('user_id'))
+    return build_price_table(pd.DataFrame(data.get('price_data', []), columns=['material', 'price']))
+
+def resolve_form_price_table():
+    """multipart リクエストから単価辞書を取得（price_file があれば優先、無ければ price_sheet_id）"""
+    price_file = request.files.get('price_file')
+    if price_file:
+        return build_price_table(read_csv_upload(price_file, category_columns=())[0])
+    return resolve_price_table(request.form)
+
+def batch_zip_response(archive_file, batch_summary, prefix):
+    """一括処理の結果 zip を返す（件数の概要はヘッダーにも付与）"""
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    response = send_file(
+        archive_file,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f"{prefix}_results_{timestamp}.zip"
+    )
+    response.headers['X-Batch-Summary'] = json.dumps(
+        {key: batch_summary[key] for key in ('files', 'succeeded', 'failed')}
+    )
+    return response
+
+def version_etag(*parts):
+    """
+    版番号とクエリ文字列から ETag を作成（版が None なら None）
+
+    版番号は応答の組み立て前に読むこと（組み立て中に書き込まれても古い版の ETag になるだけで済む）
+    """
+    if any(part is None for part in parts):
+        return None
+    payload = json.dumps([parts, sorted(request.args.items(multi=True))], ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def not_modified_response(etag):
+    """If-None-Match が ETag と一致すれば 304 を返す（一致しなければ None）"""
+    if etag is None or not request.if_none_match.contains(etag):
+        return None
+    return with_etag(app.response_class(status=304), etag)
+
+def with_etag(response, etag):
+    """ETag を付与し、ブラウザに毎回 If-None-Match で再検証させる"""
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def cached_json_body(etag, user_id, calculation_id, build):
+    """
+    JSON 応答の本文を ETag 単位で応答キャッシュから取得（無ければ build() の結果を保存）
+
+    Returns:
+        JSON のバイト列、build() が None（見つからない等）の場合は None（キャッシュしない）
+    """
+    def compute():
+        payload = build()
+        return None if payload is None else jsonify(payload).get_data()
+
+    if etag is None:
+        return compute()
+    return response_cache.get_or_compute(response_cache_key(user_id, calculation_id, etag), compute)
+
+def json_body_response(body, etag):
+    """キャッシュした JSON 本文から ETag 付きの応答を作成"""
+    return with_etag(app.response_class(body, mimetype='application/json'), etag)
+
+def calculate_result_df(item_data, price_table):
+    """計算系エンドポイント共通: 入力整形・価格計算・箱番号順の並べ替え（同一入力は結果キャッシュを利用）"""
+    item_df = prepare_item_df(pd.DataFrame(item_data))
+    snapshot = material_resolver.snapshot()
+    cache_key = compute_cache_key(item_df, price_table, snapshot.mtime)
+    return result_cache.get_or_compute(
+        cache_key,
+        lambda: finalize_result_df(parallel_pricer.price_items(item_df, price_table, snapshot))
+    )
+
+def calculate_request_result_df(data, price_table):
+    """
+    item_data、またはアップロードセッション＋修正行（patches）から計算結果を作成
+
+    Returns:
+        計算結果、セッションが見つからない（期限切れ）場合は None
+    """
+    token = data.get('upload_session')
+    if not token:
+        return calculate_result_df(data.get('item_data', []), price_table)
+
+    session = upload_session_store.get(token, request.current_user.get('user_id'))
+    if session is None:
+        return None
+    return finalize_result_df(session.price(data.get('patches', []), price_table))
+
+def summarize_result_df(result_df):
+    """計算結果の集計値（件数・合計金額・合計重量・箱数）"""
+    return {
+        'total_items': int(len(result_df)),
+        'total_value': float(result_df['jewelry_price'].sum()),
+        'total_weight': float(result_df['total_weight'].sum()),
+        'unique_boxes': int(result_df['box_id'].nunique())
+    }
 
 @app.route('/api/check-weights', methods=['POST'])
 @app.route('/check-weights', methods=['POST'])  # For local development with Vite proxy
@@ -271,33 +376,35 @@ def check_weights():
         if not file:
             return jsonify({'error': 'item_file is required'}), 400
 
-        df = pd.read_csv(file)
+        df, ingest = read_csv_upload(file)
         required_columns = ['box_id', 'box_no', 'material', 'misc', 'weight', 'brand_name']
         df = ensure_required_columns(df, required_columns)
 
-        invalids = []
-        for idx, row in df.iterrows():
-            val = row.get('weight')
-            if pd.isna(val) or str(val).strip() == "":
-                continue
-            val = str(val).strip()
-            try:
-                cleaned = re.sub(r'[^0-9.]', '', val.split('g')[0])
-                float(cleaned)
-            except Exception:
-                clean_row = row.to_dict()
-                for k, v in clean_row.items():
-                    if pd.isna(v) or (isinstance(v, float) and np.isnan(v)):
-                        clean_row[k] = ""
-                invalids.append({
-                    'index': idx,
-                    'weight': val,
-                    'box_id': row.get('box_id', ''),
-                    'box_no': row.get('box_no', ''),
-                    'row_data': clean_row
-                })
-
-        return jsonify({'invalid_weights': invalids})
+        # 追加ルール（例: ?rules=empty_material,unknown_alias）
+        extra_rules = [rule for rule in request.args.get('rules', '').split(',') if rule]
+        rules = ['invalid_weight'] + [rule for rule in extra_rules if rule != 'invalid_weight']
+        try:
+            masks = validate_items(df, rules)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        invalids = serialize_invalid_weights(df, masks['invalid_weight'])
+        response = {
+            'invalid_weights': invalids,
+            'row_count': int(len(df))
+        }
+
+        # 修正が必要な行があるときだけ解析済みデータをサーバー側に保持（以降は修正行だけ送ればよい）
+        if invalids:
+            session = upload_session_store.create(request.current_user.get('user_id'), df)
+            if session is not None:
+                response['upload_session'] = session.token
+        if extra_rules:
+            response['issues'] = serialize_issues(df, masks)
+
+        response = jsonify(response)
+        response.headers['Server-Timing'] = server_timing_header(ingest)
+        return response
 
     except Exception as e:
         print(f"❌ 重量チェックエラー: {e}")
@@ -313,34 +420,20 @@ def edit_csv():
         if not file:
             return jsonify({'error': 'CSVファイルが必要です'}), 400
 
-        df = pd.read_csv(file)
-
-        # カラム結合（NaN対応）: 複数カラムを結合して"feature"列を作成
-        feature_columns = ['misc', 'weight', 'jewelry_carat', 'jewelry_color', 'jewelry_clarity', 
-                          'jewelry_cutting', 'jewelry_shape', 'jewelry_polish', 'jewelry_symmetry', 
-                          'jewelry_fluorescence']
-        existing_feature_cols = [col for col in feature_columns if col in df.columns]
-        if existing_feature_cols:
-            df['feature'] = df[existing_feature_cols].fillna('').astype(str).agg(' '.join, axis=1).str.strip()
-
-        # 残したいカラムと対応する日本語ラベル
-        column_map = {
-            'end_date': '大会日',
-            'box_id': '箱番',
-            'box_no': '枝番',
-            'subcategory_name': '品目',
-            'brand_name': 'ブランド',
-            'material': '素材',
-            'feature': '備考',
-            'accessory_comment': '付属品'
-        }
-
-        # 必要なカラムだけを抽出
-        needed_columns = [col for col in column_map.keys() if col in df.columns]
-        df = df[needed_columns]
+        if request.args.get('stream') == '1':
+            # ストリーミングモード: チャンク単位で変換して逐次返す
+            # （列の型は事前に全体を走査して決め、一括読み込みの場合と同じ出力にする）
+            spooled = spool_upload(file)
+            edited_chunks = iter_edited_chunks(iter_csv_chunks(spooled, dtype=infer_column_dtypes(spooled)))
+            timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+            return Response(
+                stream_with_context(chunk.encode('utf-8') for chunk in iter_frames_csv(edited_chunks)),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename=edited_result_{timestamp}.csv'}
+            )
 
-        # カラム名を日本語に変換
-        df = df.rename(columns=column_map)
+        df, ingest = read_csv_upload(file)
+        df = edit_columns(df)
 
         # CSVをバイトストリームにして返す
         output = io.StringIO()
@@ -350,34 +443,60 @@ def edit_csv():
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         filename_edt = f"edited_result_{timestamp}.csv"
 
-        return send_file(
+        response = send_file(
             io.BytesIO(output.getvalue().encode('utf-8-sig')),
             mimetype='text/csv',
             as_attachment=True,
             download_name=filename_edt
         )
+        response.headers['Server-Timing'] = server_timing_header(ingest)
+        return response
 
     except Exception as e:
         print(f"❌ CSV編集エラー: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/edit-csv/batch', methods=['POST'])
+@app.route('/edit-csv/batch', methods=['POST'])
+@token_required
+def edit_csv_batch():
+    """複数 CSV の一括編集（files の複数指定、または zip の archive）"""
+    try:
+        archive_file, batch_summary = edit_batch(collect_batch_files(request.files))
+        print(f"✅ 一括CSV編集: {batch_summary['succeeded']}/{batch_summary['files']}件成功")
+        return batch_zip_response(archive_file, batch_summary, 'edited')
+
+    except BatchInputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ 一括CSV編集エラー: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/calculation-history/box-groups', methods=['GET'])
 @app.route('/calculation-history/box-groups', methods=['GET'])
 @token_required
 def get_calculation_box_groups():
-    """箱番号ごとにグループ化された計算履歴を取得（v3対応・最適化版）"""
+    """箱番号ごとにグループ化された計算履歴を取得（v3対応・?box_limit=&cursor= で箱単位のページ）"""
     try:
         user_id = request.current_user.get('user_id')
         max_per_box = request.args.get('max_per_box', 10, type=int)
+        box_limit = request.args.get('box_limit', type=int)
         
-        print(f"📦 箱番号グループ取得開始 v3 - User ID: {user_id}, Max per box: {max_per_box}")
+        etag = version_etag('box-groups', user_id, calculation_manager_v3.get_user_data_version(user_id))
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
         
-        # 新しいマネージャーで最適化されたクエリを実行
-        box_groups = calculation_manager_v3.get_box_groups(user_id, max_per_box)
+        print(f"📦 箱番号グループ取得開始 v3 - User ID: {user_id}, Max per box: {max_per_box}")
         
-        print(f"✅ 箱番号グループ取得完了 v3 - グループ数: {len(box_groups)}")
-        return jsonify({'box_groups': box_groups})
+        # 箱ごとの上位件数の絞り込みは SQL 側で行う
+        body = cached_json_body(etag, user_id, None, lambda: calculation_manager_v3.get_box_groups_page(
+            user_id, max_per_box, box_limit=box_limit, cursor_token=request.args.get('cursor')
+        ))
+        return json_body_response(body, etag)
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"❌ 箱番号グループ取得エラー v3: {e}")
         import traceback
@@ -392,13 +511,20 @@ def get_calculation_box_groups_by_history(history_id):
     try:
         user_id = request.current_user.get('user_id')
         
+        etag = version_etag('box-groups', user_id, history_id,
+                            calculation_manager_v3.get_calculation_version(history_id, user_id))
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+        
         print(f"📦 特定履歴内箱番号グループ取得開始 - History ID: {history_id}, User ID: {user_id}")
         
         # 特定の計算履歴内でのボックスグループを取得
-        box_groups = calculation_manager_v3.get_box_groups_by_calculation(history_id, user_id)
-        
-        print(f"✅ 特定履歴内箱番号グループ取得完了 - グループ数: {len(box_groups)}")
-        return jsonify({'box_groups': box_groups, 'history_id': history_id})
+        body = cached_json_body(etag, user_id, history_id, lambda: {
+            'box_groups': calculation_manager_v3.get_box_groups_by_calculation(history_id, user_id),
+            'history_id': history_id
+        })
+        return json_body_response(body, etag)
         
     except Exception as e:
         print(f"❌ 特定履歴内箱番号グループ取得エラー: {e}")
@@ -406,6 +532,39 @@ def get_calculation_box_groups_by_history(history_id):
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/calculation-history/reprice', methods=['POST'])
+@app.route('/calculation-history/reprice', methods=['POST'])
+@app.route('/api/calculation-history/<int:history_id>/reprice', methods=['POST'])
+@app.route('/calculation-history/<int:history_id>/reprice', methods=['POST'])
+@token_required
+def reprice_calculations(history_id=None):
+    """保存済み計算を新しい相場で一括再計算"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'error': 'No JSON provided'}), 400
+
+        user_id = request.current_user.get('user_id')
+        calculation_ids = [history_id] if history_id is not None else data.get('calculation_ids', [])
+        if not calculation_ids:
+            return jsonify({'error': '計算IDが必要です'}), 400
+
+        price_table = resolve_price_table(data)
+        if price_table is None:
+            return jsonify({'error': '相場表が見つかりません'}), 404
+
+        result = calculation_manager_v3.reprice_calculations(calculation_ids, user_id, price_table)
+        if result:
+            return jsonify(result)
+        else:
+            return jsonify({'error': '再計算対象の計算履歴が見つかりません'}), 404
+
+    except Exception as e:
+        print(f"❌ 再計算エラー: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/calculation-history/<int:history_id>', methods=['DELETE'])
 @app.route('/calculation-history/<int:history_id>', methods=['DELETE'])
 @token_required
@@ -432,45 +591,67 @@ def get_calculation_stats():
     try:
         user_id = request.current_user.get('user_id')
         
-        stats = calculation_manager_v3.get_user_statistics(user_id)
-        return jsonify(stats)
+        etag = version_etag('stats', user_id, calculation_manager_v3.get_user_data_version(user_id))
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+        
+        body = cached_json_body(etag, user_id, None, lambda: calculation_manager_v3.get_user_statistics(user_id))
+        return json_body_response(body, etag)
         
     except Exception as e:
         print(f"❌ 統計情報取得エラー v3: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+def calculate_fixed_stream():
+    """calculate-fixed のストリーミングモード: チャンク単位で計算し CSV を逐次返す"""
+    item_file = request.files.get('item_file')
+    if item_file:
+        # multipart: item_file（CSV）と price_sheet_id または price_file
+        price_table = resolve_form_price_table()
+        item_chunks = iter_csv_chunks(spool_upload(item_file), dtype=str)
+    else:
+        data = request.json
+        if not data:
+            return jsonify({'error': 'No JSON provided'}), 400
+        price_table = resolve_price_table(data)
+        item_chunks = iter_record_chunks(data.get('item_data', []))
+
+    if price_table is None:
+        return jsonify({'error': '相場表が見つかりません'}), 404
+
+    sort = request.args.get('sort', '1') != '0'
+    csv_chunks = iter_calculated_csv(iter_priced_chunks(item_chunks, price_table), sort=sort)
+
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    filename_cal = f"calculated_result_{timestamp}.csv"
+
+    return Response(
+        stream_with_context(chunk.encode('utf-8') for chunk in csv_chunks),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename_cal}'}
+    )
+
 @app.route('/api/calculate-fixed', methods=['POST'])
 @app.route('/calculate-fixed', methods=['POST'])
 @token_required
 def calculate_fixed():
     try:
+        if request.args.get('stream') == '1' or 'item_file' in request.files:
+            return calculate_fixed_stream()
+
         data = request.json
         if not data:
             return jsonify({'error': 'No JSON provided'}), 400
 
-        item_df = pd.DataFrame(data.get('item_data', []))
-        price_df = pd.DataFrame(data.get('price_data', []))
-
-        for idx, row in item_df.iterrows():
-            if 'weight' in row and str(row['weight']).strip() == "":
-                item_df.at[idx, 'weight'] = None
-
-        required_columns = ['box_id', 'box_no', 'material', 'misc', 'weight', 'brand_name']
-        item_df = ensure_required_columns(item_df, required_columns)
-
-        result_df = calculate_items(item_df, price_df)
+        price_table = resolve_price_table(data)
+        if price_table is None:
+            return jsonify({'error': '相場表が見つかりません'}), 404
 
-        result_df['box_no'] = pd.to_numeric(result_df['box_no'], errors='coerce').fillna(0).astype(int)
-        result_df['box_id'] = pd.to_numeric(result_df['box_id'], errors='coerce').fillna(0).astype(int)
-        result_df = result_df.sort_values(by=['box_id', 'box_no'])
-
-        output_columns = [
-            'box_id', 'box_no', 'material', 'brand_name', 'misc', 'weight',
-            'jewelry_price', 'material_price', 'total_weight',
-            'gemstone_weight', 'material_weight'
-        ]
-        result_df = result_df[[col for col in output_columns if col in result_df.columns]]
+        result_df = calculate_request_result_df(data, price_table)
+        if result_df is None:
+            return jsonify({'error': 'アップロードセッションの有効期限が切れました'}), 410
 
         return_format = request.args.get('format', 'csv')
         
@@ -496,10 +677,243 @@ def calculate_fixed():
                 download_name=filename_cal
             )
 
+    except PatchError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"❌ Calculate fixed error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/calculate-fixed/batch', methods=['POST'])
+@app.route('/calculate-fixed/batch', methods=['POST'])
+@token_required
+def calculate_fixed_batch():
+    """複数 CSV の一括価格計算（相場は price_file または price_sheet_id で共通指定）"""
+    try:
+        price_table = resolve_form_price_table()
+        if price_table is None:
+            return jsonify({'error': '相場表が見つかりません'}), 404
+
+        archive_file, batch_summary = calculate_batch(collect_batch_files(request.files), price_table)
+        print(f"✅ 一括価格計算: {batch_summary['succeeded']}/{batch_summary['files']}件成功")
+        return batch_zip_response(archive_file, batch_summary, 'calculated')
+
+    except BatchInputError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ 一括価格計算エラー: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/calculate-and-save', methods=['POST'])
+@app.route('/calculate-and-save', methods=['POST'])
+@token_required
+def calculate_and_save():
+    """価格計算とDB保存を1回のリクエストで実行（計算済みアイテムは返さない）"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'error': 'No JSON provided'}), 400
+
+        user_id = request.current_user.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'ユーザーIDが見つかりません'}), 400
+
+        if not data.get('item_data') and not data.get('upload_session'):
+            return jsonify({'error': 'アイテムデータが必要です'}), 400
+
+        price_table = resolve_price_table(data)
+        if price_table is None:
+            return jsonify({'error': '相場表が見つかりません'}), 404
+
+        calculation_name = data.get('calculation_name') or f"計算_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        result_df = calculate_request_result_df(data, price_table)
+        if result_df is None:
+            return jsonify({'error': 'アップロードセッションの有効期限が切れました'}), 410
+        summary = summarize_result_df(result_df)
+
+        calculation_results = {
+            'timestamp': datetime.now().isoformat(),
+            'total_items': summary['total_items'],
+            'total_value': summary['total_value'],
+            'calculation_method': 'metal_calculation'
+        }
+        if data.get('price_sheet_id'):
+            calculation_results['price_sheet_id'] = data['price_sheet_id']
+
+        # NaN は None に揃えてから保存（1トランザクションで挿入される）
+        items = result_df.astype(object).where(result_df.notna(), None).to_dict('records')
+        history_id = calculation_manager_v3.save_calculation(
+            user_id=user_id,
+            calculation_name=calculation_name,
+            item_data=items,
+            calculation_results=calculation_results
+        )
+
+        if history_id:
+            return jsonify({
+                'message': '計算結果が保存されました（v3）',
+                'history_id': history_id,
+                'summary': summary
+            }), 201
+        else:
+            return jsonify({'error': '計算結果の保存に失敗しました'}), 500
+
+    except PatchError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Calculate and save error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/calculate-scenarios', methods=['POST'])
+@app.route('/calculate-scenarios', methods=['POST'])
+@token_required
+def calculate_scenarios():
+    """複数相場（シナリオ）での評価額を一括計算"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'error': 'No JSON provided'}), 400
+
+        scenarios = data.get('scenarios', [])
+        if not scenarios:
+            return jsonify({'error': 'シナリオが必要です'}), 400
+
+        # シナリオごとの単価辞書（price_adjustment_pct で相場を ±% 調整可能）
+        scenario_names = []
+        price_tables = []
+        for index, scenario in enumerate(scenarios):
+            price_table = resolve_price_table(scenario)
+            if price_table is None:
+                return jsonify({'error': f'シナリオ{index + 1}の相場表が見つかりません'}), 404
+
+            adjustment = float(scenario.get('price_adjustment_pct') or 0)
+            if adjustment:
+                price_table = {main: price * (1 + adjustment / 100) for main, price in price_table.items()}
+
+            scenario_names.append(scenario.get('name') or f'シナリオ{index + 1}')
+            price_tables.append(price_table)
+
+        item_df = prepare_item_df(pd.DataFrame(data.get('item_data', [])))
+        item_df['box_no'] = pd.to_numeric(item_df['box_no'], errors='coerce').fillna(0).astype(int)
+        item_df['box_id'] = pd.to_numeric(item_df['box_id'], errors='coerce').fillna(0).astype(int)
+        item_df = item_df.sort_values(by=['box_id', 'box_no'], kind='mergesort').reset_index(drop=True)
+
+        result = price_scenarios(item_df, price_tables)
+        values = result['values']
+
+        # 箱ごとの合計（箱番号順）
+        values_df = pd.DataFrame(values)
+        values_df['box_id'] = item_df['box_id'].to_numpy()
+        box_totals = values_df.groupby('box_id', sort=True)
+        box_counts = box_totals.size()
+        box_values = box_totals.sum()
+        boxes = [
+            {'box_id': int(box_id), 'item_count': int(box_counts[box_id]), 'values': box_values.loc[box_id].tolist()}
+            for box_id in box_values.index
+        ]
+
+        totals = values.sum(axis=0).tolist()
+        response = {
+            'scenarios': [
+                {'name': name, 'total_value': total}
+                for name, total in zip(scenario_names, totals)
+            ],
+            'totals': totals,
+            'boxes': boxes,
+            'total_items': int(len(item_df))
+        }
+
+        if data.get('include_items', True):
+            items_df = item_df[['box_id', 'box_no', 'material', 'weight', 'misc']].copy()
+            items_df['total_weight'] = result['total_weight']
+            items_df['gemstone_weight'] = result['gemstone_weight']
+            items_df['material_weight'] = result['material_weight']
+            items = items_df.astype(object).where(items_df.notna(), None).to_dict('records')
+            for item, material_prices, item_values in zip(items, result['material_prices'].tolist(), values.tolist()):
+                item['material_prices'] = material_prices
+                item['values'] = item_values
+            response['items'] = items
+
+        return jsonify(response)
+
+    except Exception as e:
+        print(f"❌ シナリオ計算エラー: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# =====================================
+# 相場表エンドポイント
+# =====================================
+
+@app.route('/api/price-sheets', methods=['POST'])
+@app.route('/price-sheets', methods=['POST'])
+@token_required
+def upload_price_sheet():
+    """相場表をアップロード（内容ハッシュをIDとして返す）"""
+    try:
+        user_id = request.current_user.get('user_id')
+
+        file = request.files.get('price_file')
+        if file:
+            price_data = read_csv_upload(file, category_columns=())[0].to_dict('records')
+            name = request.form.get('name') or file.filename
+        else:
+            data = request.json
+            if not data:
+                return jsonify({'error': 'No JSON provided'}), 400
+            price_data = data.get('price_data', [])
+            name = data.get('name')
+
+        if not price_data:
+            return jsonify({'error': '相場データが必要です'}), 400
+
+        sheet = price_sheet_manager.upload_price_sheet(price_data, user_id=user_id, name=name)
+        if not sheet:
+            return jsonify({'error': '相場表の保存に失敗しました'}), 500
+
+        return jsonify({
+            'price_sheet_id': sheet['id'],
+            'price_sheet': sheet
+        }), 201 if sheet['created'] else 200
+
+    except Exception as e:
+        print(f"❌ 相場表アップロードエラー: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/price-sheets', methods=['GET'])
+@app.route('/price-sheets', methods=['GET'])
+@token_required
+def list_price_sheets():
+    """自分がアップロードした相場表の一覧を取得"""
+    try:
+        user_id = request.current_user.get('user_id')
+        limit = request.args.get('limit', 50, type=int)
+        return jsonify({'price_sheets': price_sheet_manager.list_price_sheets(user_id, limit)})
+
+    except Exception as e:
+        print(f"❌ 相場表一覧取得エラー: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/price-sheets/<sheet_id>', methods=['GET'])
+@app.route('/price-sheets/<sheet_id>', methods=['GET'])
+@token_required
+def get_price_sheet(sheet_id):
+    """自分がアップロードした相場表を内容付きで取得"""
+    try:
+        user_id = request.current_user.get('user_id')
+        sheet = price_sheet_manager.get_price_sheet(sheet_id, user_id)
+        if sheet:
+            return jsonify(sheet)
+        else:
+            return jsonify({'error': '相場表が見つかりません'}), 404
+
+    except Exception as e:
+        print(f"❌ 相場表取得エラー: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # =====================================
 # 管理者専用エンドポイント
 # =====================================
@@ -558,6 +972,24 @@ def admin_view_db_content():
         print(f"❌ Admin DB content error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/result-cache-stats', methods=['GET'])
+@app.route('/admin/result-cache-stats', methods=['GET'])
+@token_required
+def admin_result_cache_stats():
+    """管理者専用: 計算結果キャッシュのヒット率"""
+    if request.current_user.get('role') != 'admin':
+        return jsonify({'message': '管理者権限が必要です'}), 403
+    return jsonify(result_cache.stats())
+
+@app.route('/api/admin/response-cache-stats', methods=['GET'])
+@app.route('/admin/response-cache-stats', methods=['GET'])
+@token_required
+def admin_response_cache_stats():
+    """管理者専用: 計算履歴の応答キャッシュのヒット率"""
+    if request.current_user.get('role') != 'admin':
+        return jsonify({'message': '管理者権限が必要です'}), 403
+    return jsonify(response_cache.stats())
+
 @app.route('/api/admin/download-db', methods=['GET'])
 @app.route('/admin/download-db', methods=['GET'])
 @token_required
@@ -574,6 +1006,10 @@ def admin_download_db():
         if not os.path.exists(DATABASE_PATH):
             return jsonify({'error': 'データベースファイルが見つかりません'}), 404
         
+        # WAL に残っている更新を本体ファイルへ書き戻してから送る
+        from sqlite_pool import get_pool
+        get_pool(DATABASE_PATH).checkpoint()
+        
         return send_file(
             DATABASE_PATH,
             mimetype='application/octet-stream',
@@ -597,25 +1033,15 @@ def update_calculation_item(history_id, item_index):
     try:
         user_id = request.current_user.get('user_id')
         
-        # 計算履歴の詳細を取得
-        detail = calculation_manager_v3.get_calculation_detail(history_id, user_id)
-        if not detail:
-            return jsonify({'error': '計算履歴が見つかりません'}), 404
-        
-        # アイテムインデックスの検証
-        items = detail['calculation_data']['items']
-        if item_index < 0 or item_index >= len(items):
-            return jsonify({'error': '無効なアイテムインデックスです'}), 400
-        
         # 更新データの取得
         update_data = request.get_json()
         if not update_data:
             return jsonify({'error': '更新データが必要です'}), 400
         
-        # 該当アイテムのIDを取得
-        item_id = items[item_index].get('id')
+        # 詳細画面と同じ並び順でインデックスからアイテムIDを取得（計算全体は読み込まない）
+        item_id = calculation_manager_v3.get_item_id_at(history_id, user_id, item_index)
         if not item_id:
-            return jsonify({'error': 'アイテムIDが見つかりません'}), 400
+            return jsonify({'error': '無効なアイテムインデックスです'}), 400
         
         # アイテムデータの更新
         success = calculation_manager_v3.update_calculation_item(
@@ -636,6 +1062,55 @@ def update_calculation_item(history_id, item_index):
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/calculation-items/<int:item_id>', methods=['PATCH'])
+@app.route('/calculation-items/<int:item_id>', methods=['PATCH'])
+@token_required
+def patch_calculation_item(item_id):
+    """アイテムIDを指定して更新（更新後のアイテムを返す）"""
+    try:
+        user_id = request.current_user.get('user_id')
+
+        update_data = request.get_json()
+        if not update_data:
+            return jsonify({'error': '更新データが必要です'}), 400
+
+        item = calculation_manager_v3.update_item_by_id(item_id, user_id, update_data)
+        if item is None:
+            return jsonify({'error': 'アイテムが見つかりません'}), 404
+        return jsonify({'message': 'アイテムが正常に更新されました', 'item': item})
+
+    except ItemEditError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ アイテム更新エラー: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/calculation-items', methods=['PATCH'])
+@app.route('/calculation-items', methods=['PATCH'])
+@token_required
+def bulk_patch_calculation_items():
+    """複数アイテムを一括編集（{"items": [{"id": ..., カラム: 値}, ...]}、全件成功か全件失敗）"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({'error': 'items が必要です'}), 400
+
+        user_id = request.current_user.get('user_id')
+        result = calculation_manager_v3.bulk_update_items(user_id, data['items'])
+        if result is None:
+            return jsonify({'error': '編集対象のアイテムが見つかりません'}), 404
+        return jsonify(result)
+
+    except ItemEditError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ 一括編集エラー: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 # =====================================
 # その他のエンドポイント（既存のまま）
 # =====================================
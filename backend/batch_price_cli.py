@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+過去オークション CSV の一括価格計算（コマンドライン版）
+- API と同じ価格計算エンジン・素材エイリアス表・CSV 取り込みを使う
+- ディレクトリ以下の CSV を CPU コア数のプロセスで並列に計算し、同じ構成で結果を書き出す
+- --save-to-db を指定すると CalculationManagerV3 経由で計算履歴として保存
+- 処理済みファイルを進捗ファイル（JSON Lines）に記録し、中断しても続きから再開できる
+  （DB 保存時は保存の commit 直前に計算IDを記録し、再開時に DB と照合して二重保存しない）
+
+使い方:
+    python batch_price_cli.py ./archive --price-file prices.csv --output-dir ./priced
+    python batch_price_cli.py ./archive --price-sheet-id <ID> --save-to-db --user-id 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set
+
+from csv_ingest import read_csv_upload
+from material_resolver import MaterialAliasSnapshot, material_resolver
+from pricing_engine import REQUIRED_ITEM_COLUMNS, build_price_table, finalize_result_df, prepare_item_df, price_items
+
+PROGRESS_FILENAME = '.batch_progress.jsonl'
+# calculation_manager_v3.DATABASE_PATH と同じ（--help だけで DB モジュールを読み込まないよう直接持つ）
+DEFAULT_DB_PATH = 'users.db'
+
+# ワーカー側で保持するエイリアス表と単価辞書
+_worker_snapshot = None
+_worker_price_table = None
+
+
+def _init_worker(alias_to_main: Dict[str, str], price_table: Dict[str, float]):
+    """ワーカー初期化: エイリアス表と単価辞書を1回だけ受け取る"""
+    global _worker_snapshot, _worker_price_table
+    _worker_snapshot = MaterialAliasSnapshot(alias_to_main)
+    _worker_price_table = price_table
+
+
+def iter_csv_files(input_dir: str, exclude_dir: Optional[str] = None) -> Iterator[str]:
+    """input_dir 以下の CSV を相対パスで列挙（実行ごとに同じ順序。exclude_dir 以下は対象外）"""
+    for root, dirs, files in os.walk(input_dir):
+        # 出力先が入力ディレクトリの中にある場合、前回の結果を入力として拾わない
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != exclude_dir)
+        for name in sorted(files):
+            if name.lower().endswith('.csv') and not name.startswith('.'):
+                yield os.path.relpath(os.path.join(root, name), input_dir)
+
+
+def load_progress(progress_path: str) -> Dict[str, Dict]:
+    """進捗ファイルから処理済み（最後の記録が成功）のファイルとその記録を取得"""
+    done = {}
+    if not os.path.exists(progress_path):
+        return done
+
+    with open(progress_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 中断時に書きかけになった最終行は無視
+                continue
+            if record.get('status') == 'ok':
+                done[record['file']] = record
+            else:
+                done.pop(record.get('file'), None)
+    return done
+
+
+def find_unsaved(manager, done: Dict[str, Dict], user_id: int) -> Set[str]:
+    """
+    DB 保存済みと記録されたファイルのうち、実際には保存されていないものを返す
+
+    進捗は commit 直前に書くため、その直後に中断すると記録だけが残る。
+    ロールバックされた ID は次の保存で再利用されるので、ID と計算名の両方で照合する
+    """
+    unsaved = set()
+    for rel_path, record in done.items():
+        if 'history_id' not in record:
+            continue
+        detail = manager.get_calculation_detail(record['history_id'], user_id, include_items=False)
+        if detail is None or detail['calculation_name'] != record.get('name'):
+            unsaved.add(rel_path)
+    return unsaved
+
+
+def price_file(input_dir: str, output_dir: str, rel_path: str, with_items: bool) -> Dict:
+    """ワーカーで1ファイルを計算して書き出す"""
+    started = time.perf_counter()
+    with open(os.path.join(input_dir, rel_path), 'rb') as f:
+        df, _ = read_csv_upload(f, log=False)
+
+    for col in REQUIRED_ITEM_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    result_df = finalize_result_df(price_items(prepare_item_df(df), _worker_price_table, _worker_snapshot))
+
+    # 書きかけのファイルが残らないよう一時ファイルに書いてから置き換える
+    output_path = os.path.join(output_dir, rel_path)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    result_df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+    os.replace(tmp_path, output_path)
+
+    result = {
+        'file': rel_path,
+        'status': 'ok',
+        'rows': int(len(result_df)),
+        'total_value': float(result_df['jewelry_price'].sum()),
+        'seconds': time.perf_counter() - started
+    }
+    if with_items:
+        result['items'] = result_df.astype(object).where(result_df.notna(), None).to_dict('records')
+    return result
+
+
+def save_result(manager, result: Dict, user_id: int, name_prefix: str, price_sheet_id: Optional[str],
+                record_progress) -> Optional[int]:
+    """計算結果を計算履歴として保存（commit 直前に計算IDを含めて進捗を記録する）"""
+    calculation_results = {
+        'timestamp': datetime.now().isoformat(),
+        'total_items': result['rows'],
+        'total_value': result['total_value'],
+        'calculation_method': 'batch_cli',
+        'source_file': result['file']
+    }
+    if price_sheet_id:
+        calculation_results['price_sheet_id'] = price_sheet_id
+
+    result['name'] = f"{name_prefix}{result['file']}"
+
+    def before_commit(calculation_id: int):
+        result['history_id'] = calculation_id
+        record_progress(result)
+
+    return manager.save_calculation(
+        user_id=user_id,
+        calculation_name=result['name'],
+        item_data=result.pop('items'),
+        calculation_results=calculation_results,
+        before_commit=before_commit
+    )
+
+
+def load_price_table(args) -> Dict[str, float]:
+    if args.price_file:
+        with open(args.price_file, 'rb') as f:
+            return build_price_table(read_csv_upload(f, category_columns=())[0])
+
+    from price_sheet_manager import PriceSheetManager
+    price_table = PriceSheetManager(db_path=args.db).get_price_table(args.price_sheet_id, None)
+    if price_table is None:
+        raise SystemExit(f"❌ 相場表が見つかりません: {args.price_sheet_id}")
+    return price_table
+
+
+def run(args) -> int:
+    input_dir = os.path.abspath(args.input_dir)
+    output_dir = os.path.abspath(args.output_dir or input_dir.rstrip(os.sep) + '_priced')
+    os.makedirs(output_dir, exist_ok=True)
+
+    progress_path = args.progress_file or os.path.join(output_dir, PROGRESS_FILENAME)
+    if args.restart and os.path.exists(progress_path):
+        os.remove(progress_path)
+    done = load_progress(progress_path)
+
+    manager = None
+    if args.save_to_db:
+        from calculation_manager_v3 import CalculationManagerV3
+        manager = CalculationManagerV3(db_path=args.db)
+        unsaved = find_unsaved(manager, done, args.user_id)
+        if unsaved:
+            print(f"⚠️ 保存が確定していないファイルを再処理します: {len(unsaved)}件")
+            for rel_path in unsaved:
+                del done[rel_path]
+
+    files: List[str] = [path for path in iter_csv_files(input_dir, exclude_dir=output_dir) if path not in done]
+    print(f"🚀 一括価格計算: 対象 {len(files)}件（処理済み {len(done)}件をスキップ）")
+    if not files:
+        return 0
+
+    price_table = load_price_table(args)
+    snapshot = material_resolver.snapshot()
+
+    succeeded = failed = 0
+    total_rows = 0
+    started = time.perf_counter()
+    # 投入中のタスク数を抑えて、大量ファイルでもメモリを一定に保つ
+    max_in_flight = args.workers * 4
+    next_report = args.report_every
+    pending_files = iter(files)
+
+    with open(progress_path, 'a', encoding='utf-8') as progress, ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(snapshot.alias_to_main, price_table)
+    ) as executor:
+        def record_progress(record: Dict):
+            # 1ファイルごとに記録（中断しても処理済み分は再計算しない）
+            progress.write(json.dumps(record, ensure_ascii=False) + '\n')
+            progress.flush()
+            os.fsync(progress.fileno())
+
+        in_flight = {}
+        try:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    rel_path = next(pending_files, None)
+                    if rel_path is None:
+                        break
+                    future = executor.submit(price_file, input_dir, output_dir, rel_path, args.save_to_db)
+                    in_flight[future] = rel_path
+
+                if not in_flight:
+                    break
+
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    rel_path = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                        if manager is not None:
+                            # 保存時は commit 直前に記録される
+                            history_id = save_result(manager, result, args.user_id, args.name_prefix,
+                                                     args.price_sheet_id, record_progress)
+                            if history_id is None:
+                                raise RuntimeError('計算結果の保存に失敗しました')
+                        else:
+                            record_progress(result)
+                        succeeded += 1
+                        total_rows += result['rows']
+                    except Exception as e:
+                        print(f"❌ {rel_path}: {e}")
+                        # commit 前に成功を記録済みでも、後の記録で取り消される
+                        record_progress({'file': rel_path, 'status': 'error', 'error': str(e)})
+                        failed += 1
+
+                if succeeded + failed >= next_report:
+                    elapsed = time.perf_counter() - started
+                    print(f"📊 {succeeded + failed}/{len(files)}件 ({total_rows}行, {elapsed:.1f}秒)")
+                    next_report += args.report_every
+
+        except KeyboardInterrupt:
+            print("\n⚠️ 中断しました。同じコマンドを再実行すると続きから処理します。")
+            executor.shutdown(wait=False, cancel_futures=True)
+            return 130
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ 完了: 成功 {succeeded}件 / 失敗 {failed}件, {total_rows}行, {elapsed:.1f}秒")
+    print(f"📁 出力先: {output_dir}")
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ディレクトリ以下の CSV を一括で価格計算します')
+    parser.add_argument('input_dir', help='CSV を含むディレクトリ（サブディレクトリも対象）')
+    parser.add_argument('--output-dir', help='結果の出力先（既定: <input_dir>_priced）')
+
+    price = parser.add_mutually_exclusive_group(required=True)
+    price.add_argument('--price-file', help='相場表 CSV（material, price）')
+    price.add_argument('--price-sheet-id', help='保存済み相場表の ID')
+
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='並列プロセス数')
+    parser.add_argument('--save-to-db', action='store_true', help='計算履歴としてDBに保存する')
+    parser.add_argument('--user-id', type=int, help='保存先ユーザーID（--save-to-db 時は必須）')
+    parser.add_argument('--name-prefix', default='一括計算_', help='保存時の計算名の接頭辞')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='データベースファイル')
+    parser.add_argument('--progress-file', help=f"進捗ファイル（既定: 出力先の {PROGRESS_FILENAME}）")
+    parser.add_argument('--restart', action='store_true', help='進捗を破棄して最初から処理する')
+    parser.add_argument('--report-every', type=int, default=100, help='進捗を表示する件数間隔')
+
+    args = parser.parse_args(argv)
+    if args.save_to_db and args.user_id is None:
+        parser.error('--save-to-db には --user-id が必要です')
+    args.workers = max(1, args.workers)
+    args.report_every = max(1, args.report_every)
+    return args
+
+
+if __name__ == '__main__':
+    sys.exit(run(parse_args()))
@@ -0,0 +1,258 @@
+"""
+複数 CSV の一括処理モジュール
+- zip アーカイブまたは multipart の複数ファイルを受け取り、ファイルごとに edit / calculate を実行
+- ファイル単位でスレッドプールに投入（エイリアス表・単価辞書は全ファイルで共有）
+- 結果 CSV とファイルごとの集計（summary.json）を1つの zip にまとめて返す
+- 入力・結果の CSV は1ファイルずつ SpooledTemporaryFile に置き、結果は入力順に zip へ書き出してすぐ破棄する
+  （全ファイル分をメモリに溜め込まない）
+"""
+
+import json
+import os
+import posixpath
+import shutil
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from csv_editing import edit_columns
+from csv_ingest import read_csv_upload
+from item_validation import validate_items
+from material_resolver import MaterialAliasSnapshot, material_resolver
+from pricing_engine import REQUIRED_ITEM_COLUMNS, finalize_result_df, prepare_item_df, price_items
+
+# 同時に処理するファイル数
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', min(8, (os.cpu_count() or 1) * 2)))
+# 1リクエストで受け付ける最大ファイル数
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 500))
+# zip 展開後の合計サイズ上限（zip 爆弾対策。Cloud Run の /tmp はメモリ上にあるため小さめにする）
+BATCH_MAX_TOTAL_BYTES = int(os.environ.get('BATCH_MAX_TOTAL_BYTES', 64 * 1024 * 1024))
+# 結果 zip をメモリに保持する上限（超えるとディスクに書き出す）
+BATCH_SPOOL_BYTES = int(os.environ.get('BATCH_SPOOL_BYTES', 32 * 1024 * 1024))
+# 入力・結果の CSV を1ファイルごとにメモリに保持する上限（超えるとディスクに書き出す）
+BATCH_FILE_SPOOL_BYTES = int(os.environ.get('BATCH_FILE_SPOOL_BYTES', 2 * 1024 * 1024))
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+SUMMARY_FILENAME = 'summary.json'
+
+
+class BatchInputError(ValueError):
+    """一括処理の入力が不正"""
+
+
+def _is_csv_name(name: str) -> bool:
+    base = posixpath.basename(name)
+    return name.lower().endswith('.csv') and not base.startswith('.') and not name.startswith('__MACOSX/')
+
+
+def _spool_copy(source, limit: int, message: str) -> Tuple[IO[bytes], int]:
+    """source を SpooledTemporaryFile に写す（limit バイトを超えたら BatchInputError）"""
+    spool = tempfile.SpooledTemporaryFile(max_size=BATCH_FILE_SPOOL_BYTES)
+    size = 0
+    try:
+        while True:
+            chunk = source.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                raise BatchInputError(message)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, size
+
+
+def _read_zip(file_storage, files: List[Tuple[str, IO[bytes]]], total_bytes: int) -> int:
+    try:
+        archive = zipfile.ZipFile(file_storage.stream)
+    except zipfile.BadZipFile:
+        raise BatchInputError(f"zip ファイルを読み込めません: {file_storage.filename}")
+
+    message = '展開後のファイルサイズが上限を超えています'
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_csv_name(info.filename):
+                continue
+            # ヘッダーの申告サイズで先に弾き、展開中も実際のバイト数で確認する
+            if total_bytes + info.file_size > BATCH_MAX_TOTAL_BYTES:
+                raise BatchInputError(message)
+            with archive.open(info) as member:
+                spool, size = _spool_copy(member, BATCH_MAX_TOTAL_BYTES - total_bytes, message)
+            files.append((info.filename, spool))
+            total_bytes += size
+    return total_bytes
+
+
+def collect_batch_files(request_files) -> List[Tuple[str, IO[bytes]]]:
+    """
+    リクエストから (ファイル名, 内容のファイル) の一覧を作成
+
+    multipart の files（複数可）と、zip アーカイブ（.zip で終わるファイル）の中の CSV を対象にする
+    """
+    files: List[Tuple[str, IO[bytes]]] = []
+    total_bytes = 0
+
+    try:
+        for file_storage in request_files.getlist('files') + request_files.getlist('archive'):
+            filename = file_storage.filename or ''
+            if filename.lower().endswith('.zip'):
+                total_bytes = _read_zip(file_storage, files, total_bytes)
+            else:
+                spool, size = _spool_copy(file_storage.stream, BATCH_MAX_TOTAL_BYTES - total_bytes,
+                                          'ファイルサイズの合計が上限を超えています')
+                files.append((filename or f'file_{len(files) + 1}.csv', spool))
+                total_bytes += size
+
+            if len(files) > BATCH_MAX_FILES:
+                raise BatchInputError(f"ファイル数が上限（{BATCH_MAX_FILES}件）を超えています")
+    except BaseException:
+        close_batch_files(files)
+        raise
+
+    if not files:
+        raise BatchInputError('CSVファイルが必要です（files または zip の archive）')
+    return files
+
+
+def close_batch_files(files: List[Tuple[str, IO[bytes]]]):
+    for _, file in files:
+        file.close()
+
+
+def _output_name(prefix: str, filename: str, used: set) -> str:
+    """出力ファイル名（重複したら連番を付ける）"""
+    stem = posixpath.splitext(posixpath.basename(filename))[0]
+    name = f"{prefix}_{stem}.csv"
+    counter = 2
+    while name in used:
+        name = f"{prefix}_{stem}_{counter}.csv"
+        counter += 1
+    used.add(name)
+    return name
+
+
+def _to_csv_file(df) -> IO[bytes]:
+    """結果 CSV（BOM 付き UTF-8）を SpooledTemporaryFile に書き出し、先頭に巻き戻して返す"""
+    output = tempfile.SpooledTemporaryFile(max_size=BATCH_FILE_SPOOL_BYTES)
+    df.to_csv(output, index=False, encoding='utf-8-sig', mode='wb')
+    output.seek(0)
+    return output
+
+
+def edit_file(filename: str, file: IO[bytes]) -> Tuple[IO[bytes], Dict]:
+    """1ファイル分の edit-csv"""
+    df, ingest = read_csv_upload(file)
+    edited = edit_columns(df)
+    return _to_csv_file(edited), {
+        'rows': int(len(edited)),
+        'encoding': ingest['encoding'],
+        'ingest_seconds': ingest['seconds']
+    }
+
+
+def calculate_file(filename: str, file: IO[bytes], price_table: Dict[str, float],
+                   snapshot: MaterialAliasSnapshot) -> Tuple[IO[bytes], Dict]:
+    """1ファイル分の calculate-fixed（重量不正の行は従来どおり重量0として計算）"""
+    df, ingest = read_csv_upload(file)
+    for col in REQUIRED_ITEM_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+
+    invalid_weights = int(validate_items(df)['invalid_weight'].sum())
+    result_df = finalize_result_df(price_items(prepare_item_df(df), price_table, snapshot))
+
+    return _to_csv_file(result_df), {
+        'rows': int(len(result_df)),
+        'invalid_weights': invalid_weights,
+        'total_value': float(result_df['jewelry_price'].sum()),
+        'total_weight': float(result_df['total_weight'].sum()),
+        'unique_boxes': int(result_df['box_id'].nunique()),
+        'encoding': ingest['encoding'],
+        'ingest_seconds': ingest['seconds']
+    }
+
+
+def _run_one(process: Callable[[str, IO[bytes]], Tuple[IO[bytes], Dict]], filename: str,
+             file: IO[bytes]) -> Tuple[Optional[IO[bytes]], Dict]:
+    try:
+        output, summary = process(filename, file)
+        return output, {'file': filename, 'status': 'ok', **summary}
+    except Exception as e:
+        # 1ファイルの失敗で全体を止めない
+        print(f"❌ 一括処理エラー ({filename}): {e}")
+        return None, {'file': filename, 'status': 'error', 'error': str(e)}
+    finally:
+        file.close()
+
+
+def _iter_outcomes(files: List[Tuple[str, IO[bytes]]],
+                   process: Callable[[str, IO[bytes]], Tuple[IO[bytes], Dict]]) -> Iterator[Tuple[Optional[IO[bytes]], Dict]]:
+    """入力順に結果を返す（投入中のファイル数を抑え、書き出し待ちの結果を溜め込まない）"""
+    workers = max(1, min(BATCH_WORKERS, len(files)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for filename, file in files:
+            in_flight.append(executor.submit(_run_one, process, filename, file))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def run_batch(files: List[Tuple[str, IO[bytes]]], process: Callable[[str, IO[bytes]], Tuple[IO[bytes], Dict]],
+              prefix: str) -> Tuple[tempfile.SpooledTemporaryFile, Dict]:
+    """
+    ファイルを並行処理して結果 zip を作成（入力ファイルは処理後に閉じる）
+
+    Returns:
+        (先頭に巻き戻した zip ファイル, 全体の集計 {files, succeeded, failed, results})
+    """
+    archive_file = tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_BYTES)
+    used_names = set()
+    results = []
+    try:
+        with zipfile.ZipFile(archive_file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for (filename, _), (output, summary) in zip(files, _iter_outcomes(files, process)):
+                if output is not None:
+                    summary['output'] = _output_name(prefix, filename, used_names)
+                    with output, archive.open(summary['output'], 'w') as entry:
+                        shutil.copyfileobj(output, entry, COPY_CHUNK_BYTES)
+                results.append(summary)
+
+            succeeded = sum(1 for summary in results if summary['status'] == 'ok')
+            batch_summary = {
+                'files': len(results),
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded,
+                'results': results
+            }
+            archive.writestr(SUMMARY_FILENAME, json.dumps(batch_summary, ensure_ascii=False, indent=2))
+    except BaseException:
+        archive_file.close()
+        raise
+    finally:
+        close_batch_files(files)
+
+    archive_file.seek(0)
+    return archive_file, batch_summary
+
+
+def edit_batch(files: List[Tuple[str, IO[bytes]]]):
+    """複数ファイルの edit-csv"""
+    return run_batch(files, edit_file, 'edited')
+
+
+def calculate_batch(files: List[Tuple[str, IO[bytes]]], price_table: Dict[str, float]):
+    """複数ファイルの calculate-fixed（全ファイルで同じエイリアス表を使う）"""
+    snapshot = material_resolver.snapshot()
+    return run_batch(
+        files,
+        lambda filename, file: calculate_file(filename, file, price_table, snapshot),
+        'calculated'
+    )
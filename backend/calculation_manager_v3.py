@@ -2,26 +2,343 @@
 新しい3テーブル構造に対応した計算データマネージャー v3
 - calculations テーブル: 計算セッション
 - calculation_items テーブル: 個別アイテム
-- calculation_summaries_view: 集計ビュー
+- calculation_summaries テーブル: 計算ごとの集計（書き込み時に更新）
+- calculation_summaries_view: 集計ビュー（互換用）
+- calculations.version / calculation_user_versions: 書き込みごとに増える版番号（ETag 用）
 """
 
-import sqlite3
 import json
+import threading
+import time
 from datetime import datetime
-import re
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterable, Callable
+
+import pandas as pd
+
+from db_manager import bulk_insert, iter_batches
+from keyset_pagination import (
+    InvalidCursorError, SortColumn, SortSpec, clamp_limit, decode_cursor, encode_cursor, keyset_condition
+)
+from material_resolver import material_resolver
+from response_cache import invalidate_calculations, response_cache
+from sqlite_pool import get_connection
+from weight_parser import parse_weight
 
 DATABASE_PATH = 'users.db'
 
+# calculation_items への INSERT 対象カラム（save_calculation の行タプルと同じ順序）
+CALCULATION_ITEM_COLUMNS = (
+    'calculation_id', 'box_id', 'box_no', 'material', 'weight_text', 'weight_grams',
+    'misc', 'jewelry_price', 'material_price', 'total_weight',
+    'gemstone_weight', 'material_weight', 'created_at'
+)
+
+class ItemEditError(ValueError):
+    """アイテム編集の内容が不正"""
+
+
+def map_unique(values: List[Any], func: Callable[[Any], Any]) -> List[Any]:
+    """値ごとに func を適用（同じ値は1回だけ計算、欠損値は None）"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    mapped = [func(value) for value in uniques] + [None]
+    # 欠損値のコード -1 は末尾の None を参照する
+    return [mapped[code] for code in codes]
+
+def to_box_no(box_no: Any) -> Optional[int]:
+    """枝番を整数化（変換できなければ None）"""
+    if box_no is None:
+        return None
+    try:
+        return int(box_no)
+    except (ValueError, TypeError):
+        return None
+
+# IN 句1回あたりの ID 数（SQLite の変数上限より小さくする）
+SQL_ID_BATCH = 500
+
+# ユーザーが編集できるアイテムのカラム
+EDITABLE_ITEM_FIELDS = (
+    'box_id', 'box_no', 'material', 'weight_text', 'weight_grams',
+    'jewelry_price', 'material_price', 'total_weight',
+    'gemstone_weight', 'material_weight', 'misc',
+    'brand_name', 'subcategory_name', 'accessory_comment',
+    'budget_lower', 'budget_upper', 'budget_reserve',
+    'frame_price', 'side_stone_price', 'live', 'rank'
+)
+# 一括編集1回あたりの最大件数
+BULK_EDIT_MAX_ITEMS = 10000
+
+# ページサイズ（既定値・上限）
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 200
+ITEM_PAGE_SIZE = 500
+ITEM_PAGE_MAX = 2000
+
+# 計算履歴の並び順（それぞれ idx_calculations_user_* で索引走査になる）
+HISTORY_SORTS = {
+    'newest': SortSpec('newest', (
+        SortColumn('c.created_at', 'created_at', descending=True),
+        SortColumn('c.id', 'id', descending=True, nullable=False)
+    )),
+    'oldest': SortSpec('oldest', (
+        SortColumn('c.created_at', 'created_at'),
+        SortColumn('c.id', 'id', nullable=False)
+    )),
+    'name': SortSpec('name', (
+        SortColumn('c.calculation_name', 'calculation_name', nullable=False),
+        SortColumn('c.id', 'id', nullable=False)
+    ))
+}
+
+# アイテムの並び順（それぞれ idx_calculation_items_* で索引走査になる）
+ITEM_SORTS = {
+    'box': SortSpec('box', (
+        SortColumn('box_id', 'box_id', nullable=False),
+        SortColumn('box_no', 'box_no'),
+        SortColumn('id', 'id', nullable=False)
+    )),
+    'price': SortSpec('price', (
+        SortColumn('jewelry_price', 'jewelry_price', descending=True),
+        SortColumn('id', 'id', descending=True, nullable=False)
+    ))
+}
+
+# 箱グループ一覧の箱単位ページング（box_id は NOT NULL）
+BOX_SORT = SortSpec('box_groups', (SortColumn('ci.box_id', 'box_id', nullable=False),))
+BOX_PAGE_MAX = 500
+
+# ページネーション用の索引（SQLite の索引は末尾に rowid(id) を持つので id は列挙しない）
+PAGINATION_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_calculations_user_created ON calculations(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_calculations_user_name ON calculations(user_id, calculation_name)",
+    # get_box_groups の順位付けもこの索引だけで完結する（calculation_id, box_id, id を含む）
+    "CREATE INDEX IF NOT EXISTS idx_calculation_items_box_order ON calculation_items(calculation_id, box_id, box_no)",
+    "CREATE INDEX IF NOT EXISTS idx_calculation_items_price ON calculation_items(calculation_id, jewelry_price)",
+)
+
 class CalculationManagerV3:
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
+        # スキーマの補完は最初の接続時に1回だけ行う（import・生成だけでは DB ファイルに触らない）
+        self._schema_lock = threading.RLock()
+        self._schema_state = None
     
     def _get_connection(self):
-        """データベース接続を取得"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """データベース接続を取得（スレッドごとのプール接続。close() でプールに返却）"""
+        if self._schema_state != 'ready':
+            self._ensure_schema()
+        return get_connection(self.db_path)
+
+    def _ensure_schema(self):
+        """版番号列・集計テーブル・索引を補完（他スレッドは完了まで待つ）"""
+        with self._schema_lock:
+            # 実施済み、または同じスレッドで実施中（_ensure_* 内の接続取得からの再入）
+            if self._schema_state is not None:
+                return
+            self._schema_state = 'running'
+            try:
+                self._ensure_versioning()
+                self._ensure_summary_table()
+                self._ensure_indexes()
+            finally:
+                self._schema_state = 'ready'
+
+    def _ensure_summary_table(self):
+        """calculation_summaries テーブルが無ければ作成し、既存データから集計を作る"""
+        conn = self._get_connection()
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'calculation_summaries'"
+            ).fetchone()
+            if exists:
+                return
+
+            conn.execute("""
+                CREATE TABLE calculation_summaries (
+                    calculation_id INTEGER PRIMARY KEY REFERENCES calculations (id) ON DELETE CASCADE,
+                    total_items INTEGER NOT NULL DEFAULT 0,
+                    total_value REAL NOT NULL DEFAULT 0,
+                    total_weight REAL NOT NULL DEFAULT 0,
+                    unique_boxes INTEGER NOT NULL DEFAULT 0,
+                    average_item_value REAL NOT NULL DEFAULT 0,
+                    first_item_created DATETIME,
+                    last_item_created DATETIME
+                )
+            """)
+            conn.commit()
+            print("🆕 calculation_summaries テーブルを作成しました")
+
+            if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'calculation_items'"
+            ).fetchone():
+                self.rebuild_calculation_summaries()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ calculation_summaries テーブル作成エラー: {e}")
+        finally:
+            conn.close()
+
+    def _ensure_indexes(self):
+        """並び替え・ページネーション用の索引を作成"""
+        conn = self._get_connection()
+        try:
+            for statement in PAGINATION_INDEXES:
+                conn.execute(statement)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ 計算履歴の索引作成エラー: {e}")
+        finally:
+            conn.close()
+
+    def _ensure_versioning(self):
+        """計算ごと・ユーザーごとの版番号（calculations.version, calculation_user_versions）を用意"""
+        conn = self._get_connection()
+        try:
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(calculations)")]
+            if columns and 'version' not in columns:
+                conn.execute("ALTER TABLE calculations ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS calculation_user_versions (
+                    user_id INTEGER PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ 版番号カラム作成エラー: {e}")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump_versions(cursor, user_id: int, calculation_ids: Iterable[int] = ()):
+        """
+        書き込み時に版番号を進める（呼び出し側のトランザクション内で実行）
+
+        計算ごとの版は詳細・箱グループ、ユーザーごとの版は履歴一覧・統計の ETag と応答キャッシュのキーに使う。
+        古い版の応答キャッシュは参照されなくなるが、メモリを空けるためここで削除する
+        """
+        calculation_ids = list(calculation_ids)
+        invalidate_calculations(user_id, calculation_ids)
+        now = datetime.now().isoformat()
+        for batch in iter_batches(calculation_ids, SQL_ID_BATCH):
+            cursor.execute(f"""
+                UPDATE calculations SET version = version + 1, updated_at = ?
+                WHERE id IN ({', '.join(['?'] * len(batch))})
+            """, [now] + batch)
+        cursor.execute("""
+            INSERT INTO calculation_user_versions (user_id, version) VALUES (?, 1)
+            ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+        """, (user_id,))
+
+    def get_calculation_version(self, calculation_id: int, user_id: int) -> Optional[str]:
+        """
+        計算の版を取得（主キー検索のみ）、見つからない場合はNone
+
+        削除後に同じIDが再利用されても区別できるよう作成日時も含める
+        """
+        conn = self._get_connection()
+        try:
+            row = conn.execute(
+                "SELECT version, created_at FROM calculations WHERE id = ? AND user_id = ?", (calculation_id, user_id)
+            ).fetchone()
+            return f"{row['version']}:{row['created_at']}" if row else None
+        except Exception as e:
+            print(f"❌ 版番号取得エラー: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def get_user_data_version(self, user_id: int) -> Optional[int]:
+        """ユーザーの計算データ全体の版番号を取得"""
+        conn = self._get_connection()
+        try:
+            row = conn.execute(
+                "SELECT version FROM calculation_user_versions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            return row['version'] if row else 0
+        except Exception as e:
+            print(f"❌ 版番号取得エラー: {e}")
+            return None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _refresh_summaries(cursor, calculation_ids: Iterable[int]):
+        """
+        指定した計算の集計行を calculation_items から作り直す（呼び出し側のトランザクション内で実行）
+
+        行単位のトリガーだと一括挿入で行数分の再集計が走るため、書き込み処理の最後に計算単位でまとめて更新する
+        """
+        ids = list(calculation_ids)
+        for batch in iter_batches(ids, SQL_ID_BATCH):
+            placeholders = ', '.join(['?'] * len(batch))
+            cursor.execute(f"DELETE FROM calculation_summaries WHERE calculation_id IN ({placeholders})", batch)
+            cursor.execute(f"""
+                INSERT INTO calculation_summaries (
+                    calculation_id, total_items, total_value, total_weight, unique_boxes,
+                    average_item_value, first_item_created, last_item_created
+                )
+                SELECT
+                    calculation_id,
+                    COUNT(*),
+                    COALESCE(SUM(jewelry_price), 0),
+                    COALESCE(SUM(total_weight), 0),
+                    COUNT(DISTINCT box_id),
+                    COALESCE(AVG(jewelry_price), 0),
+                    MIN(created_at),
+                    MAX(created_at)
+                FROM calculation_items
+                WHERE calculation_id IN ({placeholders})
+                GROUP BY calculation_id
+            """, batch)
+
+    def rebuild_calculation_summaries(self) -> int:
+        """
+        calculation_summaries を全件作り直す（既存DBへの導入時・不整合の修復用）
+
+        Returns:
+            作成した集計行数、失敗時は -1
+        """
+        conn = self._get_connection()
+        try:
+            started = time.perf_counter()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM calculation_summaries")
+            cursor.execute("""
+                INSERT INTO calculation_summaries (
+                    calculation_id, total_items, total_value, total_weight, unique_boxes,
+                    average_item_value, first_item_created, last_item_created
+                )
+                SELECT
+                    calculation_id,
+                    COUNT(*),
+                    COALESCE(SUM(jewelry_price), 0),
+                    COALESCE(SUM(total_weight), 0),
+                    COUNT(DISTINCT box_id),
+                    COALESCE(AVG(jewelry_price), 0),
+                    MIN(created_at),
+                    MAX(created_at)
+                FROM calculation_items
+                WHERE calculation_id IN (SELECT id FROM calculations)
+                GROUP BY calculation_id
+            """)
+            rebuilt = cursor.rowcount
+            # 集計値が変わり得るので全ての版番号を進め、応答キャッシュも空にする
+            cursor.execute("UPDATE calculations SET version = version + 1")
+            cursor.execute("UPDATE calculation_user_versions SET version = version + 1")
+            response_cache.invalidate_prefix(['u'])
+            conn.commit()
+            print(f"✅ 集計テーブル再構築完了: {rebuilt}件 ({time.perf_counter() - started:.2f}秒)")
+            return rebuilt
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ 集計テーブル再構築エラー: {e}")
+            return -1
+        finally:
+            conn.close()
     
     def normalize_box_id(self, box_id: Any) -> Optional[int]:
         """box_idを統一されたINTEGER形式に正規化"""
@@ -42,17 +359,11 @@ class CalculationManagerV3:
             return None
     
     def parse_weight(self, weight_text: Any) -> Optional[float]:
-        """重量テキストから数値を抽出"""
-        if not weight_text:
-            return None
-        try:
-            weight_str = str(weight_text).strip()
-            cleaned = re.sub(r'[^0-9.]', '', weight_str.split('g')[0])
-            return float(cleaned) if cleaned else None
-        except (ValueError, TypeError):
-            return None
+        """重量テキストから数値（g）を抽出"""
+        return parse_weight(weight_text)
     
-    def save_calculation(self, user_id: int, calculation_name: str, item_data: List[Dict], calculation_results: Dict = None) -> Optional[int]:
+    def save_calculation(self, user_id: int, calculation_name: str, item_data: List[Dict], calculation_results: Dict = None,
+                         before_commit: Optional[Callable[[int], None]] = None) -> Optional[int]:
         """
         計算結果を新しい3テーブル構造に保存
         
@@ -61,12 +372,37 @@ class CalculationManagerV3:
             calculation_name: 計算名
             item_data: アイテムデータのリスト
             calculation_results: 計算結果の追加情報
+            before_commit: commit 直前に計算IDを渡して呼ぶ関数（例外ならロールバック。呼び出し側の記録用）
         
         Returns:
             作成された計算ID、失敗時はNone
         """
         conn = self._get_connection()
         try:
+            # 行タプルは最初の INSERT より前にまとめて作成する（書き込みロックは INSERT から commit まで）
+            started = time.perf_counter()
+            now = datetime.now().isoformat()
+            box_ids = map_unique([item.get('box_id') for item in item_data], self.normalize_box_id)
+            box_nos = map_unique([item.get('box_no') for item in item_data], to_box_no)
+            weight_grams = map_unique([item.get('weight') for item in item_data], self.parse_weight)
+            rows = [
+                (
+                    box_id,
+                    box_no,
+                    item.get('material'),
+                    str(item.get('weight', '')) if item.get('weight') else None,
+                    grams,
+                    item.get('misc'),
+                    item.get('jewelry_price'),
+                    item.get('material_price'),
+                    item.get('total_weight'),
+                    item.get('gemstone_weight'),
+                    item.get('material_weight'),
+                    now
+                )
+                for item, box_id, box_no, grams in zip(item_data, box_ids, box_nos, weight_grams)
+            ]
+
             cursor = conn.cursor()
             
             # calculationsテーブルに基本情報を挿入
@@ -77,48 +413,27 @@ class CalculationManagerV3:
                 user_id, 
                 calculation_name,
                 json.dumps(calculation_results, ensure_ascii=False) if calculation_results else None,
-                datetime.now().isoformat(),
-                datetime.now().isoformat()
+                now,
+                now
             ))
             
             calculation_id = cursor.lastrowid
             
-            # calculation_itemsテーブルにアイテムデータを挿入
-            for item in item_data:
-                box_id = self.normalize_box_id(item.get('box_id'))
-                box_no = item.get('box_no')
-                if box_no is not None:
-                    try:
-                        box_no = int(box_no)
-                    except (ValueError, TypeError):
-                        box_no = None
-                
-                weight_grams = self.parse_weight(item.get('weight'))
-                
-                cursor.execute("""
-                    INSERT INTO calculation_items (
-                        calculation_id, box_id, box_no, material, weight_text, weight_grams,
-                        misc, jewelry_price, material_price, total_weight,
-                        gemstone_weight, material_weight, created_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    calculation_id,
-                    box_id,
-                    box_no,
-                    item.get('material'),
-                    str(item.get('weight', '')) if item.get('weight') else None,
-                    weight_grams,
-                    item.get('misc'),
-                    item.get('jewelry_price'),
-                    item.get('material_price'),
-                    item.get('total_weight'),
-                    item.get('gemstone_weight'),
-                    item.get('material_weight'),
-                    datetime.now().isoformat()
-                ))
+            # calculation_itemsテーブルにアイテムデータを一括挿入
+            inserted = bulk_insert(
+                cursor, 'calculation_items', CALCULATION_ITEM_COLUMNS,
+                ((calculation_id,) + row for row in rows),
+                db_type='sqlite'
+            )
+            self._refresh_summaries(cursor, [calculation_id])
+            self._bump_versions(cursor, user_id)
+            if before_commit is not None:
+                before_commit(calculation_id)
             
             conn.commit()
-            print(f"✅ 計算データ保存完了: ID {calculation_id}, {len(item_data)}アイテム")
+            elapsed = time.perf_counter() - started
+            rows_per_second = inserted / elapsed if elapsed > 0 else float(inserted)
+            print(f"✅ 計算データ保存完了: ID {calculation_id}, {inserted}アイテム ({rows_per_second:,.0f}行/秒)")
             return calculation_id
             
         except Exception as e:
@@ -141,11 +456,43 @@ class CalculationManagerV3:
         Returns:
             計算履歴のリスト
         """
+        return self.get_calculation_history_page(user_id, limit)['histories']
+
+    def get_calculation_history_page(self, user_id: int, limit: int = HISTORY_PAGE_SIZE,
+                                     cursor_token: Optional[str] = None, sort: str = 'newest') -> Dict:
+        """
+        ユーザーの計算履歴をキーセットページネーションで取得
+
+        Args:
+            user_id: ユーザーID
+            limit: 1ページの件数
+            cursor_token: 前ページの next_cursor（先頭ページは None）
+            sort: 並び順（HISTORY_SORTS のキー）
+
+        Returns:
+            {'histories': [...], 'next_cursor': 次ページのカーソル（最終ページは None）}
+
+        Raises:
+            InvalidCursorError: カーソル・並び順が不正
+        """
+        spec = HISTORY_SORTS.get(sort)
+        if spec is None:
+            raise InvalidCursorError(f"未対応の並び順です: {sort}")
+        after = decode_cursor(spec, cursor_token)
+        limit = clamp_limit(limit, HISTORY_PAGE_SIZE, HISTORY_PAGE_MAX)
+
         conn = self._get_connection()
         try:
             cursor = conn.cursor()
-            
-            cursor.execute("""
+
+            conditions, params = ["c.user_id = ?"], [user_id]
+            if after is not None:
+                condition, condition_params = keyset_condition(spec, after)
+                conditions.append(condition)
+                params.extend(condition_params)
+
+            # 1件多く取得して次ページの有無を判定
+            cursor.execute(f"""
                 SELECT 
                     c.id,
                     c.calculation_name,
@@ -155,14 +502,16 @@ class CalculationManagerV3:
                     COALESCE(s.total_weight, 0) as total_weight,
                     COALESCE(s.unique_boxes, 0) as unique_boxes
                 FROM calculations c
-                LEFT JOIN calculation_summaries_view s ON c.id = s.calculation_id
-                WHERE c.user_id = ?
-                ORDER BY c.created_at DESC
+                LEFT JOIN calculation_summaries s ON c.id = s.calculation_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {spec.order_by()}
                 LIMIT ?
-            """, (user_id, limit))
+            """, params + [limit + 1])
+            rows = cursor.fetchall()
+            has_more = len(rows) > limit
             
             histories = []
-            for row in cursor.fetchall():
+            for row in rows[:limit]:
                 histories.append({
                     'id': row['id'],
                     'calculation_name': row['calculation_name'],
@@ -173,21 +522,25 @@ class CalculationManagerV3:
                     'unique_boxes': row['unique_boxes']
                 })
             
-            return histories
+            return {
+                'histories': histories,
+                'next_cursor': encode_cursor(spec, histories[-1]) if has_more else None
+            }
             
         except Exception as e:
             print(f"❌ 計算履歴取得エラー: {e}")
-            return []
+            return {'histories': [], 'next_cursor': None}
         finally:
             conn.close()
     
-    def get_calculation_detail(self, calculation_id: int, user_id: int) -> Optional[Dict]:
+    def get_calculation_detail(self, calculation_id: int, user_id: int, include_items: bool = True) -> Optional[Dict]:
         """
         計算履歴の詳細情報を取得
         
         Args:
             calculation_id: 計算ID
             user_id: ユーザーID
+            include_items: False の場合はアイテムを含めない（アイテムは get_calculation_items_page で取得）
         
         Returns:
             計算詳細データ、見つからない場合はNone
@@ -209,7 +562,7 @@ class CalculationManagerV3:
                     s.unique_boxes,
                     s.average_item_value
                 FROM calculations c
-                LEFT JOIN calculation_summaries_view s ON c.id = s.calculation_id
+                LEFT JOIN calculation_summaries s ON c.id = s.calculation_id
                 WHERE c.id = ? AND c.user_id = ?
             """, (calculation_id, user_id))
             
@@ -217,42 +570,17 @@ class CalculationManagerV3:
             if not calc_row:
                 return None
             
-            # アイテム情報を取得
-            cursor.execute("""
-                SELECT *
-                FROM calculation_items
-                WHERE calculation_id = ?
-                ORDER BY box_id, box_no
-            """, (calculation_id,))
-            
             items = []
-            for item_row in cursor.fetchall():
-                items.append({
-                    'id': item_row['id'],
-                    'box_id': item_row['box_id'],
-                    'box_no': item_row['box_no'],
-                    'material': item_row['material'],
-                    'weight': item_row['weight_text'],
-                    'weight_text': item_row['weight_text'],
-                    'weight_grams': item_row['weight_grams'],
-                    'misc': item_row['misc'],
-                    'jewelry_price': item_row['jewelry_price'],
-                    'material_price': item_row['material_price'],
-                    'total_weight': item_row['total_weight'],
-                    'gemstone_weight': item_row['gemstone_weight'],
-                    'material_weight': item_row['material_weight'],
-                    'brand_name': item_row['brand_name'],
-                    'subcategory_name': item_row['subcategory_name'],
-                    'accessory_comment': item_row['accessory_comment'],
-                    'budget_lower': item_row['budget_lower'],
-                    'budget_upper': item_row['budget_upper'],
-                    'budget_reserve': item_row['budget_reserve'],
-                    'frame_price': item_row['frame_price'],
-                    'side_stone_price': item_row['side_stone_price'],
-                    'live': item_row['live'],
-                    'rank': item_row['rank'],
-                    'created_at': item_row['created_at']
-                })
+            if include_items:
+                # アイテム情報を取得
+                cursor.execute("""
+                    SELECT *
+                    FROM calculation_items
+                    WHERE calculation_id = ?
+                    ORDER BY box_id, box_no, id
+                """, (calculation_id,))
+                
+                items = [self._item_to_dict(item_row) for item_row in cursor.fetchall()]
             
             # 旧形式と互換性のあるレスポンス構造
             result = {
@@ -287,6 +615,97 @@ class CalculationManagerV3:
         finally:
             conn.close()
     
+    @staticmethod
+    def _item_to_dict(item_row) -> Dict:
+        """calculation_items の行をAPIレスポンス用の辞書に変換"""
+        return {
+            'id': item_row['id'],
+            'box_id': item_row['box_id'],
+            'box_no': item_row['box_no'],
+            'material': item_row['material'],
+            'weight': item_row['weight_text'],
+            'weight_text': item_row['weight_text'],
+            'weight_grams': item_row['weight_grams'],
+            'misc': item_row['misc'],
+            'jewelry_price': item_row['jewelry_price'],
+            'material_price': item_row['material_price'],
+            'total_weight': item_row['total_weight'],
+            'gemstone_weight': item_row['gemstone_weight'],
+            'material_weight': item_row['material_weight'],
+            'brand_name': item_row['brand_name'],
+            'subcategory_name': item_row['subcategory_name'],
+            'accessory_comment': item_row['accessory_comment'],
+            'budget_lower': item_row['budget_lower'],
+            'budget_upper': item_row['budget_upper'],
+            'budget_reserve': item_row['budget_reserve'],
+            'frame_price': item_row['frame_price'],
+            'side_stone_price': item_row['side_stone_price'],
+            'live': item_row['live'],
+            'rank': item_row['rank'],
+            'created_at': item_row['created_at']
+        }
+
+    def get_calculation_items_page(self, calculation_id: int, user_id: int, limit: int = ITEM_PAGE_SIZE,
+                                   cursor_token: Optional[str] = None, sort: str = 'box') -> Optional[Dict]:
+        """
+        計算のアイテムをキーセットページネーションで取得
+
+        Args:
+            calculation_id: 計算ID
+            user_id: ユーザーID
+            limit: 1ページの件数
+            cursor_token: 前ページの next_cursor（先頭ページは None）
+            sort: 並び順（ITEM_SORTS のキー）
+
+        Returns:
+            {'items': [...], 'next_cursor': ...}、計算が見つからない場合はNone
+
+        Raises:
+            InvalidCursorError: カーソル・並び順が不正
+        """
+        spec = ITEM_SORTS.get(sort)
+        if spec is None:
+            raise InvalidCursorError(f"未対応の並び順です: {sort}")
+        after = decode_cursor(spec, cursor_token)
+        limit = clamp_limit(limit, ITEM_PAGE_SIZE, ITEM_PAGE_MAX)
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+
+            # 権限確認（主キー検索のみ）
+            cursor.execute("SELECT 1 FROM calculations WHERE id = ? AND user_id = ?", (calculation_id, user_id))
+            if not cursor.fetchone():
+                return None
+
+            conditions, params = ["calculation_id = ?"], [calculation_id]
+            if after is not None:
+                condition, condition_params = keyset_condition(spec, after)
+                conditions.append(condition)
+                params.extend(condition_params)
+
+            cursor.execute(f"""
+                SELECT *
+                FROM calculation_items
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {spec.order_by()}
+                LIMIT ?
+            """, params + [limit + 1])
+            rows = cursor.fetchall()
+            has_more = len(rows) > limit
+
+            items = [self._item_to_dict(item_row) for item_row in rows[:limit]]
+            return {
+                'items': items,
+                'next_cursor': encode_cursor(spec, items[-1]) if has_more else None
+            }
+
+        except Exception as e:
+            print(f"❌ アイテム一覧取得エラー: {e}")
+            return None
+        finally:
+            conn.close()
+    
     def update_calculation_detail(self, calculation_id: int, user_id: int, calculation_data: Dict) -> bool:
         """
         計算データの更新（互換性のため）
@@ -330,9 +749,11 @@ class CalculationManagerV3:
             cursor.execute("""
                 DELETE FROM calculations WHERE id = ? AND user_id = ?
             """, (calculation_id, user_id))
+            deleted = cursor.rowcount > 0
+            self._bump_versions(cursor, user_id, [calculation_id])
             
             conn.commit()
-            return cursor.rowcount > 0
+            return deleted
             
         except Exception as e:
             conn.rollback()
@@ -341,6 +762,92 @@ class CalculationManagerV3:
         finally:
             conn.close()
     
+    def reprice_calculations(self, calculation_ids: Iterable[int], user_id: int, price_table: Dict[str, float]) -> Optional[Dict]:
+        """
+        保存済み計算を新しい相場で再計算（material_price / jewelry_price を一括更新）
+
+        素材名はユニーク値ごとにPython側で単価へ解決し、一時テーブル経由の
+        UPDATE 1文で全アイテムを更新する
+
+        Args:
+            calculation_ids: 計算IDのリスト
+            user_id: ユーザーID
+            price_table: 正規化済み主素材名 → 単価 の辞書
+
+        Returns:
+            更新件数の情報、失敗時はNone
+        """
+        started = time.perf_counter()
+        ids = sorted({int(calculation_id) for calculation_id in calculation_ids})
+        if not ids:
+            return {'updated_calculations': 0, 'updated_items': 0, 'calculation_ids': [], 'elapsed_seconds': 0.0}
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS reprice_ids (id INTEGER PRIMARY KEY)")
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS reprice_prices (material TEXT PRIMARY KEY, price REAL NOT NULL)")
+            cursor.execute("DELETE FROM temp.reprice_ids")
+            cursor.execute("DELETE FROM temp.reprice_prices")
+
+            # 権限確認：ユーザー所有の計算だけを対象にする
+            cursor.executemany("INSERT INTO temp.reprice_ids (id) VALUES (?)", [(i,) for i in ids])
+            cursor.execute("""
+                DELETE FROM temp.reprice_ids
+                WHERE id NOT IN (SELECT id FROM calculations WHERE user_id = ?)
+            """, (user_id,))
+
+            cursor.execute("SELECT id FROM temp.reprice_ids ORDER BY id")
+            owned_ids = [row['id'] for row in cursor.fetchall()]
+            if not owned_ids:
+                conn.rollback()
+                return None
+
+            # 素材名はユニーク値ごとに1回だけ解決
+            cursor.execute("""
+                SELECT DISTINCT ci.material
+                FROM calculation_items ci
+                JOIN temp.reprice_ids r ON ci.calculation_id = r.id
+                WHERE ci.material IS NOT NULL
+            """)
+            snapshot = material_resolver.snapshot()
+            cursor.executemany(
+                "INSERT INTO temp.reprice_prices (material, price) VALUES (?, ?)",
+                [(row['material'], snapshot.resolve_price(row['material'], price_table)) for row in cursor.fetchall()]
+            )
+
+            cursor.execute("""
+                UPDATE calculation_items
+                SET material_price = COALESCE(
+                        (SELECT p.price FROM temp.reprice_prices p WHERE p.material = calculation_items.material), 0),
+                    jewelry_price = COALESCE(material_weight, 0) * COALESCE(
+                        (SELECT p.price FROM temp.reprice_prices p WHERE p.material = calculation_items.material), 0)
+                WHERE calculation_id IN (SELECT id FROM temp.reprice_ids)
+            """)
+            updated_items = cursor.rowcount
+            self._refresh_summaries(cursor, owned_ids)
+            self._bump_versions(cursor, user_id, owned_ids)
+
+            conn.commit()
+            elapsed = time.perf_counter() - started
+            print(f"✅ 再計算完了: {len(owned_ids)}件の計算, {updated_items}アイテム ({elapsed:.2f}秒)")
+            return {
+                'updated_calculations': len(owned_ids),
+                'updated_items': updated_items,
+                'calculation_ids': owned_ids,
+                'elapsed_seconds': round(elapsed, 3)
+            }
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ 再計算エラー: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+        finally:
+            conn.close()
+
     def get_user_statistics(self, user_id: int) -> Dict:
         """
         ユーザーの統計情報を取得
@@ -397,12 +904,73 @@ class CalculationManagerV3:
         Returns:
             箱番号別グループデータ
         """
+        return self.get_box_groups_page(user_id, max_per_box)['box_groups']
+
+    def get_box_groups_page(self, user_id: int, max_per_box: int = 10, box_limit: Optional[int] = None,
+                            cursor_token: Optional[str] = None) -> Dict:
+        """
+        箱番号別のグループ化データを箱単位のページで取得
+
+        箱ごとの上位 max_per_box 件への絞り込みは SQL 内で行い、Python には表示する行だけを渡す。
+        順位付けは対象ページの箱の範囲だけを (calculation_id, box_id) の索引で読んで行う
+
+        Args:
+            user_id: ユーザーID
+            max_per_box: 箱ごとの最大取得数（新しい計算順）
+            box_limit: 1ページの箱数（None なら全箱）
+            cursor_token: 前ページの next_cursor
+
+        Returns:
+            {'box_groups': {box_id: [...]}, 'next_cursor': 次ページのカーソル（最終ページは None）}
+
+        Raises:
+            InvalidCursorError: カーソルが不正
+        """
+        after = decode_cursor(BOX_SORT, cursor_token)
+        if box_limit is not None:
+            box_limit = clamp_limit(box_limit, BOX_PAGE_MAX, BOX_PAGE_MAX)
+        max_per_box = max(1, max_per_box)
+
         conn = self._get_connection()
         try:
             cursor = conn.cursor()
-            
-            # 各箱ごとに最新のアイテムを取得
+            started = time.perf_counter()
+
+            # 対象ページの箱番号（1件多く取得して次ページの有無を判定）
+            conditions, params = ["c.user_id = ?", "ci.box_id IS NOT NULL"], [user_id]
+            if after is not None:
+                condition, condition_params = keyset_condition(BOX_SORT, after)
+                conditions.append(condition)
+                params.extend(condition_params)
+            limit_clause = "LIMIT ?" if box_limit is not None else ""
+            if box_limit is not None:
+                params.append(box_limit + 1)
+
+            cursor.execute(f"""
+                SELECT DISTINCT ci.box_id
+                FROM calculations c
+                JOIN calculation_items ci ON ci.calculation_id = c.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY ci.box_id
+                {limit_clause}
+            """, params)
+            box_ids = [row['box_id'] for row in cursor.fetchall()]
+            has_more = box_limit is not None and len(box_ids) > box_limit
+            if has_more:
+                box_ids = box_ids[:box_limit]
+            if not box_ids:
+                return {'box_groups': {}, 'next_cursor': None}
+
+            # 順位付けは ID だけで行い、上位の行だけ本体を読む
             cursor.execute("""
+                WITH ranked AS (
+                    SELECT
+                        ci.id,
+                        ROW_NUMBER() OVER (PARTITION BY ci.box_id ORDER BY c.created_at DESC, ci.id DESC) as rn
+                    FROM calculations c
+                    JOIN calculation_items ci ON ci.calculation_id = c.id
+                    WHERE c.user_id = ? AND ci.box_id BETWEEN ? AND ?
+                )
                 SELECT 
                     ci.box_id,
                     c.id as calculation_id,
@@ -417,51 +985,51 @@ class CalculationManagerV3:
                     ci.total_weight,
                     ci.gemstone_weight,
                     ci.material_weight,
-                    ci.misc,
-                    ROW_NUMBER() OVER (PARTITION BY ci.box_id ORDER BY c.created_at DESC, ci.id DESC) as rn
-                FROM calculation_items ci
-                JOIN calculations c ON ci.calculation_id = c.id
-                WHERE c.user_id = ? AND ci.box_id IS NOT NULL
-            """, (user_id,))
+                    ci.misc
+                FROM ranked r
+                JOIN calculation_items ci ON ci.id = r.id
+                JOIN calculations c ON c.id = ci.calculation_id
+                WHERE r.rn <= ?
+                ORDER BY ci.box_id, r.rn
+            """, (user_id, box_ids[0], box_ids[-1], max_per_box))
             
             box_groups = {}
             for row in cursor.fetchall():
-                if row['rn'] <= max_per_box:  # 最大件数制限
-                    box_id = str(row['box_id'])  # 文字列として統一
-                    
-                    if box_id not in box_groups:
-                        box_groups[box_id] = []
-                    
-                    box_groups[box_id].append({
-                        'history_id': row['calculation_id'],
-                        'calculation_name': row['calculation_name'],
-                        'created_at': row['created_at'],
-                        'item': {
-                            'id': row['item_id'],
-                            'box_id': row['box_id'],
-                            'box_no': row['box_no'],
-                            'material': row['material'],
-                            'weight': row['weight'],
-                            'jewelry_price': row['jewelry_price'],
-                            'material_price': row['material_price'],
-                            'total_weight': row['total_weight'],
-                            'gemstone_weight': row['gemstone_weight'],
-                            'material_weight': row['material_weight'],
-                            'misc': row['misc']
-                        }
-                    })
-            
-            # 箱番号でソート
-            sorted_box_ids = sorted(box_groups.keys(), key=lambda x: int(x) if x.isdigit() else 999999)
-            sorted_groups = {box_id: box_groups[box_id] for box_id in sorted_box_ids}
-            
-            return sorted_groups
+                box_id = str(row['box_id'])  # 文字列として統一
+                
+                if box_id not in box_groups:
+                    box_groups[box_id] = []
+                
+                box_groups[box_id].append({
+                    'history_id': row['calculation_id'],
+                    'calculation_name': row['calculation_name'],
+                    'created_at': row['created_at'],
+                    'item': {
+                        'id': row['item_id'],
+                        'box_id': row['box_id'],
+                        'box_no': row['box_no'],
+                        'material': row['material'],
+                        'weight': row['weight'],
+                        'jewelry_price': row['jewelry_price'],
+                        'material_price': row['material_price'],
+                        'total_weight': row['total_weight'],
+                        'gemstone_weight': row['gemstone_weight'],
+                        'material_weight': row['material_weight'],
+                        'misc': row['misc']
+                    }
+                })
+
+            print(f"📦 箱グループ取得: {len(box_groups)}箱 ({time.perf_counter() - started:.3f}秒)")
+            return {
+                'box_groups': box_groups,
+                'next_cursor': encode_cursor(BOX_SORT, {'box_id': box_ids[-1]}) if has_more else None
+            }
             
         except Exception as e:
             print(f"❌ 箱グループ取得エラー: {e}")
             import traceback
             traceback.print_exc()
-            return {}
+            return {'box_groups': {}, 'next_cursor': None}
         finally:
             conn.close()
     
@@ -593,18 +1161,8 @@ class CalculationManagerV3:
             if not cursor.fetchone():
                 return False
             
-            # 更新可能なフィールドを定義（実際のDBカラムに合わせる）
-            allowed_fields = [
-                'box_id', 'box_no', 'material', 'weight_text', 'weight_grams',
-                'jewelry_price', 'material_price', 'total_weight',
-                'gemstone_weight', 'material_weight', 'misc',
-                'brand_name', 'subcategory_name', 'accessory_comment',
-                'budget_lower', 'budget_upper', 'budget_reserve',
-                'frame_price', 'side_stone_price', 'live', 'rank'
-            ]
-            
-            # 更新データをフィルタリング
-            filtered_data = {k: v for k, v in update_data.items() if k in allowed_fields}
+            # 更新データをフィルタリング（実際のDBカラムに合わせる）
+            filtered_data = self.filter_item_update(update_data)
             
             print(f"🔍 Original update_data: {update_data}")
             print(f"🔍 Filtered data: {filtered_data}")
@@ -632,9 +1190,10 @@ class CalculationManagerV3:
             print(f"🔍 With values: {values}")
             
             cursor.execute(update_sql, values)
-            conn.commit()
-            
             updated_rows = cursor.rowcount
+            self._refresh_summaries(cursor, [calculation_id])
+            self._bump_versions(cursor, user_id, [calculation_id])
+            conn.commit()
             print(f"🔍 Updated rows: {updated_rows}")
             
             return updated_rows > 0
@@ -648,5 +1207,176 @@ class CalculationManagerV3:
         finally:
             conn.close()
 
+    @staticmethod
+    def filter_item_update(update_data: Dict) -> Dict:
+        """更新データから編集可能なカラムだけを取り出す"""
+        return {k: v for k, v in update_data.items() if k in EDITABLE_ITEM_FIELDS}
+
+    def get_item_id_at(self, calculation_id: int, user_id: int, item_index: int) -> Optional[int]:
+        """詳細画面の並び順（box_id, box_no, id）で item_index 番目のアイテムIDを取得"""
+        if item_index < 0:
+            return None
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT ci.id
+                FROM calculations c
+                JOIN calculation_items ci ON ci.calculation_id = c.id
+                WHERE c.id = ? AND c.user_id = ?
+                ORDER BY ci.box_id, ci.box_no, ci.id
+                LIMIT 1 OFFSET ?
+            """, (calculation_id, user_id, item_index))
+            row = cursor.fetchone()
+            return row['id'] if row else None
+        except Exception as e:
+            print(f"❌ アイテムID取得エラー: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def update_item_by_id(self, item_id: int, user_id: int, update_data: Dict) -> Optional[Dict]:
+        """
+        アイテムIDを指定して更新（計算全体は読み込まない）
+
+        Args:
+            item_id: アイテムID
+            user_id: ユーザーID
+            update_data: 更新データ（EDITABLE_ITEM_FIELDS 以外は無視）
+
+        Returns:
+            更新後のアイテム（calculation_id 付き）、見つからない場合はNone
+
+        Raises:
+            ItemEditError: 更新可能な項目が無い
+            Exception: DB エラー（ロールバック済み）
+        """
+        filtered_data = self.filter_item_update(update_data)
+        if not filtered_data:
+            raise ItemEditError('更新可能な項目がありません')
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+
+            # 権限確認（主キー2回の検索のみ）
+            cursor.execute("""
+                SELECT ci.calculation_id
+                FROM calculation_items ci
+                JOIN calculations c ON c.id = ci.calculation_id
+                WHERE ci.id = ? AND c.user_id = ?
+            """, (item_id, user_id))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            calculation_id = row['calculation_id']
+
+            cursor.execute(
+                f"UPDATE calculation_items SET {', '.join(f'{field} = ?' for field in filtered_data)} WHERE id = ?",
+                list(filtered_data.values()) + [item_id]
+            )
+            self._refresh_summaries(cursor, [calculation_id])
+            self._bump_versions(cursor, user_id, [calculation_id])
+            conn.commit()
+
+            cursor.execute("SELECT * FROM calculation_items WHERE id = ?", (item_id,))
+            item = self._item_to_dict(cursor.fetchone())
+            item['calculation_id'] = calculation_id
+            return item
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ アイテム更新エラー: {e}")
+            # 「見つからない」（None）と区別できるよう呼び出し側に伝える
+            raise
+        finally:
+            conn.close()
+
+    def bulk_update_items(self, user_id: int, edits: List[Dict]) -> Optional[Dict]:
+        """
+        複数アイテムの編集を1トランザクションで適用
+
+        同じIDの編集を入力順にまとめてから、カラムの組み合わせごとに executemany でまとめて UPDATE する
+
+        Args:
+            user_id: ユーザーID
+            edits: [{'id': アイテムID, カラム: 値, ...}, ...]（同じIDの同じカラムは後勝ち）
+
+        Returns:
+            {'updated_items', 'calculation_ids'}、所有していないアイテムが含まれる場合はNone
+
+        Raises:
+            ItemEditError: 編集内容が不正
+            Exception: DB エラー（ロールバック済み）
+        """
+        if not edits:
+            raise ItemEditError('編集データが必要です')
+        if len(edits) > BULK_EDIT_MAX_ITEMS:
+            raise ItemEditError(f"一括編集は{BULK_EDIT_MAX_ITEMS}件までです")
+
+        # 同じIDの編集を入力順に1つにまとめる（後の編集が優先）
+        merged: Dict[int, Dict] = {}
+        for position, edit in enumerate(edits):
+            item_id = edit.get('id') if isinstance(edit, dict) else None
+            if not isinstance(item_id, int) or isinstance(item_id, bool):
+                raise ItemEditError(f"{position}件目: アイテムIDが必要です")
+            filtered_data = self.filter_item_update(edit)
+            if not filtered_data:
+                raise ItemEditError(f"{position}件目: 更新可能な項目がありません")
+            merged.setdefault(item_id, {}).update(filtered_data)
+
+        # まとめた編集をカラムの組み合わせごとに分ける（各IDは1回だけ UPDATE される）
+        statements: Dict[tuple, List[list]] = {}
+        for item_id, fields_data in merged.items():
+            fields = tuple(sorted(fields_data))
+            statements.setdefault(fields, []).append([fields_data[field] for field in fields] + [item_id])
+        item_ids = set(merged)
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            started = time.perf_counter()
+
+            # 権限確認（全アイテムがユーザーの計算に属すること）
+            calculation_ids = set()
+            owned = 0
+            for batch in iter_batches(sorted(item_ids), SQL_ID_BATCH):
+                cursor.execute(f"""
+                    SELECT ci.calculation_id, COUNT(*) as item_count
+                    FROM calculation_items ci
+                    JOIN calculations c ON c.id = ci.calculation_id
+                    WHERE c.user_id = ? AND ci.id IN ({', '.join(['?'] * len(batch))})
+                    GROUP BY ci.calculation_id
+                """, [user_id] + batch)
+                for row in cursor.fetchall():
+                    calculation_ids.add(row['calculation_id'])
+                    owned += row['item_count']
+            if owned != len(item_ids):
+                return None
+
+            for fields, rows in statements.items():
+                cursor.executemany(
+                    f"UPDATE calculation_items SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                    rows
+                )
+            self._refresh_summaries(cursor, sorted(calculation_ids))
+            self._bump_versions(cursor, user_id, sorted(calculation_ids))
+            conn.commit()
+
+            elapsed = time.perf_counter() - started
+            print(f"✅ 一括編集完了: {len(item_ids)}アイテム, {len(calculation_ids)}件の計算 ({elapsed:.2f}秒)")
+            return {
+                'updated_items': len(item_ids),
+                'calculation_ids': sorted(calculation_ids)
+            }
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ 一括編集エラー: {e}")
+            # 「見つからない」（None）と区別できるよう呼び出し側に伝える
+            raise
+        finally:
+            conn.close()
+
 # シングルトンインスタンス
 calculation_manager_v3 = CalculationManagerV3()
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+CSV 編集（edit-csv）の列変換モジュール
+- 石・重量などの列を結合して「備考」（feature）列を作成
+- 必要な列だけを残して日本語のカラム名に変換
+- 一括処理とチャンク単位のストリーミング処理で同じ変換を使う
+"""
+
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+# 結合して feature 列にするカラム（この順で空白区切り）
+FEATURE_COLUMNS = [
+    'misc', 'weight', 'jewelry_carat', 'jewelry_color', 'jewelry_clarity',
+    'jewelry_cutting', 'jewelry_shape', 'jewelry_polish', 'jewelry_symmetry',
+    'jewelry_fluorescence'
+]
+
+# 残したいカラムと対応する日本語ラベル
+EDIT_COLUMN_MAP = {
+    'end_date': '大会日',
+    'box_id': '箱番',
+    'box_no': '枝番',
+    'subcategory_name': '品目',
+    'brand_name': 'ブランド',
+    'material': '素材',
+    'feature': '備考',
+    'accessory_comment': '付属品'
+}
+
+
+def build_feature_column(df: pd.DataFrame) -> pd.Series:
+    """
+    FEATURE_COLUMNS を空白区切りで結合（NaN は空文字）
+
+    行ごとの ' '.join ではなく列単位の文字列連結で作成する
+    """
+    columns = [col for col in FEATURE_COLUMNS if col in df.columns]
+    parts = [df[col].fillna('').astype(str) for col in columns]
+    return parts[0].str.cat(parts[1:], sep=' ').str.strip()
+
+
+def edit_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """feature 列の作成・必要カラムの抽出・日本語化"""
+    if any(col in df.columns for col in FEATURE_COLUMNS):
+        df = df.assign(feature=build_feature_column(df))
+
+    needed_columns = [col for col in EDIT_COLUMN_MAP if col in df.columns]
+    return df[needed_columns].rename(columns=EDIT_COLUMN_MAP)
+
+
+def iter_edited_chunks(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """チャンクごとに列変換"""
+    for chunk in chunks:
+        yield edit_columns(chunk)
@@ -0,0 +1,190 @@
+"""
+CSV 取り込みモジュール
+- 先頭サンプルから文字コード（UTF-8 / Shift-JIS）と区切り文字を判定
+- pyarrow がインストールされていれば pyarrow エンジン（マルチスレッド）で読み込む
+- 素材・ブランドなど繰り返しの多い列は category 型にしてメモリを節約
+- 読み込み時間をログと Server-Timing ヘッダー用に返す
+"""
+
+import csv
+import io
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 判定に使う先頭サンプルのバイト数
+SNIFF_BYTES = 64 * 1024
+
+# 判定対象の区切り文字
+CANDIDATE_DELIMITERS = ',\t;|'
+
+# category 型にする列（値の種類が少なく繰り返しが多い）
+CATEGORY_COLUMNS = ('material', 'brand_name', 'subcategory_name')
+
+UTF8_BOM_BYTES = b'\xef\xbb\xbf'
+
+# pandas（C エンジン）が欠損値とみなす文字列。pyarrow の既定には 'None' と '<NA>' が無い
+PANDAS_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+
+
+def detect_encoding(sample: bytes) -> str:
+    """サンプルの文字コードを判定（UTF-8 として読めなければ Shift-JIS とみなす）"""
+    if sample.startswith(UTF8_BOM_BYTES):
+        return 'utf-8-sig'
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # サンプル末尾でマルチバイト文字が切れただけなら UTF-8
+        if e.start >= len(sample) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+        # オークションシステムの出力は Shift-JIS（Windows 拡張文字を含むため cp932）
+        return 'cp932'
+
+
+def detect_delimiter(text: str) -> str:
+    """サンプルの区切り文字を判定（判定できなければカンマ）"""
+    lines = text.splitlines()[:50]
+    if len(lines) > 1 and not text.endswith(('\n', '\r')):
+        # 途中で切れた最終行は判定に使わない
+        lines = lines[:-1]
+    try:
+        return csv.Sniffer().sniff('\n'.join(lines), delimiters=CANDIDATE_DELIMITERS).delimiter
+    except csv.Error:
+        return ','
+
+
+def sniff_csv_format(file) -> Tuple[str, str]:
+    """ファイル先頭から (文字コード, 区切り文字) を判定し、読み込み位置を先頭に戻す"""
+    sample = file.read(SNIFF_BYTES)
+    file.seek(0)
+    if isinstance(sample, str):
+        return 'utf-8', detect_delimiter(sample)
+
+    encoding = detect_encoding(sample)
+    text = sample.decode(encoding, errors='ignore')
+    return encoding, detect_delimiter(text)
+
+
+def compact_dtypes(df: pd.DataFrame, category_columns: Iterable[str] = CATEGORY_COLUMNS) -> pd.DataFrame:
+    """繰り返しの多い文字列列を category 型に変換"""
+    for col in category_columns:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def _temporal_columns(table) -> List[str]:
+    return [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+
+
+def _read_with_pyarrow(file, encoding: str, delimiter: str) -> pd.DataFrame:
+    """
+    pyarrow でマルチスレッド読み込み（C エンジンと同じ DataFrame になるよう揃える）
+
+    - 欠損値とみなす文字列は pandas の既定（'None'・'<NA>' を含む）
+    - pyarrow は日付・時刻を推論して書式が変わるため、該当列は文字列として読む
+      （先頭サンプルで列を推定し、サンプル以降で初めて現れた場合だけ読み直す）
+    - 全て空の列は float64、欠損は NaN（pyarrow は None になる）
+    """
+    read_options = pa_csv.ReadOptions(encoding=encoding, use_threads=True)
+    parse_options = pa_csv.ParseOptions(delimiter=delimiter)
+
+    def read(column_types: Dict, include_columns: Sequence[str] = ()):
+        file.seek(0)
+        return pa_csv.read_csv(
+            file,
+            read_options=read_options,
+            parse_options=parse_options,
+            convert_options=pa_csv.ConvertOptions(
+                null_values=PANDAS_NA_VALUES,
+                strings_can_be_null=True,
+                column_types=column_types,
+                include_columns=include_columns
+            )
+        )
+
+    # 先頭サンプル（最後の改行まで）で日付・時刻列を推定
+    sample = file.read(SNIFF_BYTES)
+    if isinstance(sample, bytes) and len(sample) == SNIFF_BYTES:
+        sample = sample[:sample.rfind(b'\n') + 1]
+    file.seek(0)
+    try:
+        sample_table = pa_csv.read_csv(
+            io.BytesIO(sample), read_options=read_options, parse_options=parse_options,
+            convert_options=pa_csv.ConvertOptions(null_values=PANDAS_NA_VALUES, strings_can_be_null=True)
+        )
+        as_string = {name: pa.string() for name in _temporal_columns(sample_table)}
+    except (pa.ArrowInvalid, UnicodeDecodeError):
+        as_string = {}
+
+    table = read(as_string)
+    temporal = _temporal_columns(table)
+    if temporal:
+        raw = read({name: pa.string() for name in temporal}, include_columns=temporal)
+        for name in temporal:
+            table = table.set_column(table.schema.get_field_index(name), name, raw.column(name))
+
+    df = table.to_pandas()
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_null(field.type):
+            df[field.name] = df[field.name].astype('float64')
+        elif column.null_count and df[field.name].dtype == object:
+            df[field.name] = df[field.name].fillna(np.nan)
+    return df
+
+
+def read_csv_upload(file, category_columns: Iterable[str] = CATEGORY_COLUMNS,
+                    log: bool = True) -> Tuple[pd.DataFrame, Dict]:
+    """
+    アップロードされた CSV を読み込む
+
+    Returns:
+        (DataFrame, 取り込み情報 {rows, encoding, delimiter, engine, seconds})
+    """
+    started = time.perf_counter()
+    encoding, delimiter = sniff_csv_format(file)
+
+    df = None
+    engine = 'c'
+    if PYARROW_AVAILABLE:
+        try:
+            df = _read_with_pyarrow(file, encoding, delimiter)
+            engine = 'pyarrow'
+        except Exception as e:
+            # pyarrow が解釈できない形式（引用符の崩れ等）は C エンジンで読み直す
+            print(f"⚠️ pyarrow での CSV 読込に失敗したため C エンジンで再試行します: {e}")
+            file.seek(0)
+
+    if df is None:
+        df = pd.read_csv(file, sep=delimiter, encoding=encoding)
+
+    df = compact_dtypes(df, category_columns)
+
+    ingest = {
+        'rows': int(len(df)),
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'engine': engine,
+        'seconds': time.perf_counter() - started
+    }
+    if log:
+        print(f"📥 CSV読込: {ingest['rows']}行 {encoding} {delimiter!r} {engine} {ingest['seconds']:.3f}秒")
+    return df, ingest
+
+
+def server_timing_header(ingest: Dict) -> str:
+    """取り込み時間を Server-Timing ヘッダーの値にする（ブラウザの開発者ツールで確認できる）"""
+    return f"csv-ingest;dur={ingest['seconds'] * 1000:.1f};desc=\"{ingest['engine']} {ingest['encoding']}\""
@@ -0,0 +1,260 @@
+"""
+CSV ストリーミング出力モジュール
+- アイテムをチャンク単位で価格計算し、UTF-8 BOM 付き CSV を逐次生成
+- メモリに収まらない件数は、一時ファイルに書き出したソート済みランを外部マージで並べ替える
+"""
+
+import csv
+import heapq
+import io
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from csv_ingest import sniff_csv_format
+from material_resolver import MaterialAliasSnapshot, material_resolver
+from pricing_engine import CALCULATION_OUTPUT_COLUMNS, price_items, prepare_item_df, finalize_result_df
+
+# チャンクあたりの行数
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 5000))
+# ソート待ちのチャンクをメモリに保持する上限（memory_usage(deep=True) の合計）。超えたら外部マージにする
+# 計算済みの行は 1 行あたり約 300 バイトなので既定の 16MiB でおよそ 5 万行。
+# ラン書き出し時は結合・ソートのコピーが同時に存在するため、ピークは約 2 倍（+1 チャンク）の 32MiB 強
+STREAM_SORT_MAX_BYTES = int(os.environ.get('STREAM_SORT_MAX_BYTES', 16 * 1024 * 1024))
+
+# アップロード退避時にメモリに保持する上限（超えるとディスクに書き出す）
+SPOOL_MAX_MEMORY_BYTES = int(os.environ.get('SPOOL_MAX_MEMORY_BYTES', 8 * 1024 * 1024))
+
+UTF8_BOM = '\ufeff'
+SORT_COLUMNS = ['box_id', 'box_no']
+
+
+def iter_record_chunks(records: List[Dict], chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """JSON のアイテム配列をチャンク単位の DataFrame に分割"""
+    for start in range(0, len(records), chunk_rows):
+        yield pd.DataFrame(records[start:start + chunk_rows])
+
+
+def spool_upload(file_storage):
+    """
+    アップロードファイルを一時ファイルに退避
+
+    リクエスト終了時にアップロードのストリームは閉じられるため、
+    レスポンス生成中に読み続けるものはここでコピーしておく
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_BYTES)
+    shutil.copyfileobj(file_storage.stream, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def _chunk_kind(column: pd.Series) -> str:
+    """チャンク内の列の推論結果の種類"""
+    if column.isna().all():
+        return 'empty'
+    if column.dtype == 'int64':
+        return 'int'
+    if column.dtype == 'float64':
+        return 'float'
+    if column.dtype == bool:
+        return 'bool'
+    return 'object'
+
+
+def _merged_dtype(kinds: set):
+    """
+    チャンクごとの種類から、ファイル全体を一度に読んだ場合の型を決める
+
+    - 空欄を含む整数列は float64、空欄を含む真偽値列は object（pandas の推論と同じ）
+    - 文字列が混じる列は元の文字列のまま（str）
+    """
+    values = kinds - {'empty'}
+    has_empty = 'empty' in kinds
+    if not values or values <= {'int', 'float'} and (values != {'int'} or has_empty):
+        return 'float64'
+    if values == {'int'}:
+        return 'int64'
+    if values == {'bool'} and not has_empty:
+        return bool
+    return str
+
+
+def infer_column_dtypes(file, chunk_rows: int = STREAM_CHUNK_ROWS) -> Dict[str, object]:
+    """
+    ファイル全体を一度に読んだときと同じ列の型を、チャンク単位の読み込みで求める
+
+    iter_csv_chunks(file, dtype=...) に渡すと、一括読み込み（read_csv_upload）と同じ値になる
+    （先頭ゼロの箱番 001 → 1、空欄を含む枝番 1 → 1.0 など）。読み込み位置は先頭に戻す
+    """
+    encoding, delimiter = sniff_csv_format(file)
+    kinds: Dict[str, set] = {}
+    for chunk in pd.read_csv(file, sep=delimiter, encoding=encoding, chunksize=chunk_rows):
+        for col in chunk.columns:
+            kinds.setdefault(col, set()).add(_chunk_kind(chunk[col]))
+    file.seek(0)
+    return {col: _merged_dtype(col_kinds) for col, col_kinds in kinds.items()}
+
+
+def iter_csv_chunks(file, chunk_rows: int = STREAM_CHUNK_ROWS, dtype=str) -> Iterator[pd.DataFrame]:
+    """
+    CSV をチャンク単位で読み込み、読み終えたらファイルを閉じる（文字コード・区切り文字は自動判定）
+
+    既定では全列を文字列のまま読む（チャンクごとに型推論が変わると、空欄の有無で
+    同じ列が 3 / 3.0 と出力されるため）。数値への変換は価格計算・出力整形で行う。
+    一括読み込みと同じ値が必要な場合は infer_column_dtypes の結果を dtype に渡す
+    """
+    try:
+        encoding, delimiter = sniff_csv_format(file)
+        yield from pd.read_csv(file, sep=delimiter, encoding=encoding, chunksize=chunk_rows, dtype=dtype)
+    finally:
+        file.close()
+
+
+def iter_priced_chunks(item_chunks: Iterable[pd.DataFrame], price_table: Dict[str, float],
+                       snapshot: Optional[MaterialAliasSnapshot] = None) -> Iterator[pd.DataFrame]:
+    """チャンクごとに価格計算（ストリーム全体で同じエイリアス表を使う）"""
+    if snapshot is None:
+        snapshot = material_resolver.snapshot()
+
+    for chunk in item_chunks:
+        result_df = price_items(prepare_item_df(chunk), price_table, snapshot)
+        yield finalize_result_df(result_df, sort=False)
+
+
+def _frame_to_csv(df: pd.DataFrame, header: bool = False) -> str:
+    output = io.StringIO()
+    df.to_csv(output, index=False, header=header)
+    return output.getvalue()
+
+
+def iter_frames_csv(frames: Iterable[pd.DataFrame]) -> Iterator[str]:
+    """DataFrame のチャンクを入力順のまま BOM 付き CSV テキストとして逐次生成"""
+    header_written = False
+    for frame in frames:
+        if not header_written:
+            yield UTF8_BOM + _frame_to_csv(frame.iloc[0:0], header=True)
+            header_written = True
+        yield _frame_to_csv(frame)
+
+    if not header_written:
+        yield UTF8_BOM
+
+
+def _sort_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(by=SORT_COLUMNS, kind='mergesort')
+
+
+def _take_sorted(buffered: List[pd.DataFrame]) -> pd.DataFrame:
+    """バッファを結合してソート（結合後すぐにバッファを空にし、同時に持つコピーを2つまでにする）"""
+    df = pd.concat(buffered, ignore_index=True)
+    buffered.clear()
+    return _sort_frame(df)
+
+
+def _write_run(buffered: List[pd.DataFrame], tmpdir: str, run_index: int) -> str:
+    """バッファをソートしてランファイルに書き出す（バッファは空になる）"""
+    run_path = os.path.join(tmpdir, f'run_{run_index}.csv')
+    _take_sorted(buffered).to_csv(run_path, index=False, header=False)
+    return run_path
+
+
+def _iter_frame_csv(df: pd.DataFrame, chunk_rows: int) -> Iterator[str]:
+    for start in range(0, len(df), chunk_rows):
+        yield _frame_to_csv(df.iloc[start:start + chunk_rows])
+
+
+def _iter_run_rows(path: str) -> Iterator[List[str]]:
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.reader(f)
+
+
+def _iter_merged_csv(run_paths: List[str], columns: List[str], chunk_rows: int) -> Iterator[str]:
+    """ソート済みランを箱番号・枝番のキーでマージしながら CSV テキストを生成"""
+    key_indexes = [columns.index(col) for col in SORT_COLUMNS]
+
+    def sort_key(row):
+        return tuple(int(row[i]) for i in key_indexes)
+
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    pending = 0
+
+    for row in heapq.merge(*[_iter_run_rows(path) for path in run_paths], key=sort_key):
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+            pending = 0
+
+    if pending:
+        yield output.getvalue()
+
+
+def iter_calculated_csv(priced_chunks: Iterable[pd.DataFrame], sort: bool = True,
+                        max_bytes_in_memory: int = STREAM_SORT_MAX_BYTES,
+                        chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[str]:
+    """
+    計算済みチャンクから BOM 付き CSV テキストを逐次生成
+
+    Args:
+        priced_chunks: iter_priced_chunks の出力
+        sort: 箱番号・枝番順に並べるか（False なら入力順にそのまま流す）
+        max_bytes_in_memory: ソート待ちチャンクのメモリ上限（バイト）。超えたら一時ファイルに書き出して外部マージ
+        chunk_rows: 出力1回あたりの行数
+    """
+    header_written = False
+    buffered = []
+    buffered_bytes = 0
+    run_paths = []
+    columns = None
+    tmpdir = None
+
+    try:
+        for chunk in priced_chunks:
+            if columns is None:
+                columns = list(chunk.columns)
+
+            if not sort:
+                if not header_written:
+                    yield UTF8_BOM + _frame_to_csv(chunk.iloc[0:0], header=True)
+                    header_written = True
+                yield _frame_to_csv(chunk)
+                continue
+
+            buffered.append(chunk)
+            buffered_bytes += int(chunk.memory_usage(deep=True).sum())
+            if buffered_bytes > max_bytes_in_memory:
+                # ソート済みランとして一時ファイルに退避
+                if tmpdir is None:
+                    tmpdir = tempfile.mkdtemp(prefix='calc_sort_')
+                run_paths.append(_write_run(buffered, tmpdir, len(run_paths)))
+                buffered_bytes = 0
+
+        if columns is None:
+            # 入力が空の場合はヘッダーのみ
+            yield UTF8_BOM + _frame_to_csv(pd.DataFrame(columns=CALCULATION_OUTPUT_COLUMNS), header=True)
+            return
+
+        if not header_written:
+            yield UTF8_BOM + _frame_to_csv(pd.DataFrame(columns=columns), header=True)
+
+        if not sort:
+            return
+
+        if not run_paths:
+            yield from _iter_frame_csv(_take_sorted(buffered), chunk_rows)
+            return
+
+        if buffered:
+            run_paths.append(_write_run(buffered, tmpdir, len(run_paths)))
+
+        yield from _iter_merged_csv(run_paths, columns, chunk_rows)
+
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
@@ -5,7 +5,8 @@ SQLite/PostgreSQL両対応のデータベース接続管理
 
 import os
 import json
-from typing import Optional, Dict, List, Union
+from itertools import islice
+from typing import Optional, Dict, List, Union, Iterable, Sequence
 from datetime import datetime
 
 # 環境変数でデータベースタイプを判定
@@ -17,6 +18,45 @@ if DB_TYPE == 'postgresql':
 else:
     import sqlite3
 
+# 一括 INSERT で1回に送る行数
+BULK_INSERT_BATCH_SIZE = int(os.getenv('BULK_INSERT_BATCH_SIZE', 5000))
+
+def iter_batches(rows: Iterable[tuple], batch_size: int = BULK_INSERT_BATCH_SIZE):
+    """行を batch_size 件ずつのリストに分割"""
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def bulk_insert(cursor, table: str, columns: Sequence[str], rows: Iterable[tuple],
+                db_type: str = DB_TYPE, batch_size: int = BULK_INSERT_BATCH_SIZE) -> int:
+    """
+    複数行を一括 INSERT（トランザクションの開始・コミットは呼び出し側で行う）
+
+    SQLite は executemany、PostgreSQL は execute_values（複数行 VALUES）で batch_size 件ずつ送る
+
+    Returns:
+        挿入した行数
+    """
+    column_sql = ', '.join(columns)
+    inserted = 0
+
+    if db_type == 'postgresql':
+        query = f"INSERT INTO {table} ({column_sql}) VALUES %s"
+        for batch in iter_batches(rows, batch_size):
+            psycopg2.extras.execute_values(cursor, query, batch, page_size=len(batch))
+            inserted += len(batch)
+    else:
+        placeholders = ', '.join(['?'] * len(columns))
+        query = f"INSERT INTO {table} ({column_sql}) VALUES ({placeholders})"
+        for batch in iter_batches(rows, batch_size):
+            cursor.executemany(query, batch)
+            inserted += len(batch)
+
+    return inserted
+
 class DatabaseManager:
     """データベース管理クラス（SQLite/PostgreSQL両対応）"""
     
@@ -114,6 +154,24 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def execute_bulk_insert(self, table: str, columns: Sequence[str], rows: Iterable[tuple],
+                            batch_size: int = BULK_INSERT_BATCH_SIZE) -> int:
+        """複数行を1トランザクションで一括 INSERT して行数を返す"""
+        conn = self.get_connection()
+
+        try:
+            cursor = conn.cursor()
+            inserted = bulk_insert(cursor, table, columns, rows, self.db_type, batch_size)
+            conn.commit()
+            return inserted
+
+        except Exception as e:
+            print(f"Database bulk insert error: {e}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
     def get_sql_placeholder(self) -> str:
         """SQLプレースホルダーを取得"""
         if self.db_type == 'postgresql':
@@ -0,0 +1,72 @@
+"""
+石目重量推定モジュール
+- 備考（misc）欄の石サイズ表記から石の重量（g）を推定
+- "2.5mm" は 直径^3/700、"0.30" や "0.30ct" は カラット×0.2
+- "0.05ct×12" のような個数表記に対応
+- 同じ備考文字列は繰り返し現れるため、生の文字列をキーに LRU キャッシュする
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# トークン解析用パターン（先頭の数値と、末尾の ×個数）
+_STONE_TOKEN_PATTERN = re.compile(r'(?P<number>\d+(?:\.\d+)?)(?:.*[×xX*＊](?P<count>\d+)$)?')
+
+# 石目推定から除外するトークン（サイズ表記・長さ・割合）
+_SKIP_MARKERS = ('#', 'cm', '%')
+
+MM_DIVISOR = 700
+CARAT_TO_GRAMS = 0.2
+
+GEMSTONE_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=GEMSTONE_CACHE_SIZE)
+def estimate_gemstone_weight(misc: str) -> float:
+    """備考文字列1件から石目重量を推定"""
+    gemstone_weight = 0.0
+    for token in misc.split():
+        if any(marker in token for marker in _SKIP_MARKERS):
+            continue
+
+        match = _STONE_TOKEN_PATTERN.search(token)
+        if not match:
+            continue
+
+        number = float(match.group('number'))
+        if 'mm' in token:
+            weight = number ** 3 / MM_DIVISOR
+        elif '.' in token or 'ct' in token:
+            weight = number * CARAT_TO_GRAMS
+        else:
+            continue
+
+        count = match.group('count')
+        gemstone_weight += weight * int(count) if count else weight
+
+    return gemstone_weight
+
+
+def estimate_gemstone_weights(misc: pd.Series) -> np.ndarray:
+    """備考列をまとめて推定（ユニーク値ごとに1回だけ解析）"""
+    codes, uniques = pd.factorize(misc)
+    estimated = np.array(
+        [estimate_gemstone_weight(str(value)) for value in uniques] + [0.0],
+        dtype=float
+    )
+    # 欠損値のコード -1 は末尾の 0.0 を参照する
+    return estimated[codes]
+
+
+def gemstone_cache_info() -> dict:
+    """LRU キャッシュのヒット状況"""
+    info = estimate_gemstone_weight.cache_info()
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize
+    }
@@ -0,0 +1,142 @@
+"""
+アイテムデータ検証モジュール
+- 列単位の文字列演算でルールごとの不正行マスク（bool 配列）を作成
+- 不正な行だけを辞書化して返す（NaN は列単位で空文字に置換）
+- ルールは VALIDATION_RULES に関数を追加するだけで拡張できる
+"""
+
+from functools import cached_property
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from gemstone_estimator import estimate_gemstone_weights
+from material_resolver import material_resolver, normalize_material
+from weight_parser import parse_weights
+
+DEFAULT_RULES = ('invalid_weight',)
+
+
+class ValidationContext:
+    """ルール間で共有する派生列（必要になった時に1回だけ計算）"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.snapshot = material_resolver.snapshot()
+
+    @cached_property
+    def weight_present(self) -> np.ndarray:
+        weights = self.df['weight']
+        return (weights.notna() & (weights.astype(str).str.strip() != '')).to_numpy()
+
+    @cached_property
+    def weights(self) -> np.ndarray:
+        return parse_weights(self.df['weight']).to_numpy(dtype=float)
+
+    @cached_property
+    def material_present(self) -> np.ndarray:
+        materials = self.df['material']
+        return (materials.notna() & (materials.astype(str).str.strip() != '')).to_numpy()
+
+    @cached_property
+    def material_known(self) -> np.ndarray:
+        codes, uniques = pd.factorize(self.df['material'])
+        known = np.array(
+            [self.snapshot.material_key(normalize_material(value)) is not None for value in uniques] + [False],
+            dtype=bool
+        )
+        return known[codes]
+
+
+def _invalid_weight(ctx: ValidationContext) -> np.ndarray:
+    """重量が入力されているが数値として解析できない"""
+    return ctx.weight_present & np.isnan(ctx.weights)
+
+
+def _empty_material(ctx: ValidationContext) -> np.ndarray:
+    """素材が空"""
+    return ~ctx.material_present
+
+
+def _unknown_alias(ctx: ValidationContext) -> np.ndarray:
+    """素材が入力されているが素材マップに無い"""
+    return ctx.material_present & ~ctx.material_known
+
+
+def _negative_material_weight(ctx: ValidationContext) -> np.ndarray:
+    """石目推定を差し引くと地金重量がマイナスになる"""
+    material_weight = ctx.weights - estimate_gemstone_weights(ctx.df['misc'])
+    return ~np.isnan(ctx.weights) & (material_weight < 0)
+
+
+VALIDATION_RULES: Dict[str, Callable[[ValidationContext], np.ndarray]] = {
+    'invalid_weight': _invalid_weight,
+    'empty_material': _empty_material,
+    'unknown_alias': _unknown_alias,
+    'negative_material_weight': _negative_material_weight,
+}
+
+
+def validate_items(df: pd.DataFrame, rules: Iterable[str] = DEFAULT_RULES) -> Dict[str, np.ndarray]:
+    """
+    指定ルールごとの不正行マスクを作成
+
+    Args:
+        df: box_id / box_no / material / misc / weight を含むアイテムデータ
+        rules: 適用するルール名
+
+    Returns:
+        ルール名 → bool 配列
+    """
+    unknown = [rule for rule in rules if rule not in VALIDATION_RULES]
+    if unknown:
+        raise ValueError(f"未対応の検証ルールです: {', '.join(unknown)}")
+
+    ctx = ValidationContext(df)
+    return {rule: VALIDATION_RULES[rule](ctx) for rule in rules}
+
+
+def clean_rows(df: pd.DataFrame) -> List[Dict]:
+    """行を辞書化（NaN は空文字）"""
+    return df.astype(object).where(df.notna(), '').to_dict('records')
+
+
+def serialize_invalid_weights(df: pd.DataFrame, mask: np.ndarray) -> List[Dict]:
+    """重量不正の行を check-weights の従来形式で返す"""
+    invalid_df = df[mask]
+    rows = clean_rows(invalid_df)
+    weights = invalid_df['weight'].astype(str).str.strip().tolist()
+    return [
+        {
+            'index': int(index),
+            'weight': weight,
+            'box_id': row.get('box_id', ''),
+            'box_no': row.get('box_no', ''),
+            'row_data': row
+        }
+        for index, weight, row in zip(invalid_df.index, weights, rows)
+    ]
+
+
+def serialize_issues(df: pd.DataFrame, masks: Dict[str, np.ndarray]) -> List[Dict]:
+    """いずれかのルールに該当した行を、該当ルール名の一覧付きで返す"""
+    if not masks:
+        return []
+
+    rule_names = list(masks)
+    matrix = np.column_stack([masks[rule] for rule in rule_names])
+    any_mask = matrix.any(axis=1)
+
+    issue_df = df[any_mask]
+    rows = clean_rows(issue_df)
+    return [
+        {
+            'index': int(index),
+            'rules': [rule for rule, hit in zip(rule_names, hits) if hit],
+            'box_id': row.get('box_id', ''),
+            'box_no': row.get('box_no', ''),
+            'row_data': row
+        }
+        for index, hits, row in zip(issue_df.index, matrix[any_mask], rows)
+    ]
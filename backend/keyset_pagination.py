@@ -0,0 +1,108 @@
+"""
+キーセット（カーソル）ページネーションモジュール
+- OFFSET を使わず「前ページ最後の行より後」を WHERE 条件で指定するため、何ページ目でも索引の範囲走査で済む
+- カーソルは並び順のキー値を JSON → base64url にしたもの（クライアントは中身を解釈せずそのまま返す）
+- SQLite の NULL の並び（昇順で先頭・降順で末尾）に合わせた条件を組み立てる
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class InvalidCursorError(ValueError):
+    """カーソルが壊れている・別の並び順のものである"""
+
+
+class SortColumn(NamedTuple):
+    """並び順を構成する列"""
+    expr: str           # SQL 上の式（例: c.created_at）
+    key: str            # 結果行から値を取り出すキー
+    descending: bool = False
+    nullable: bool = True
+
+
+class SortSpec(NamedTuple):
+    """並び順（最後の列は一意な ID にして順序を確定させる）"""
+    name: str
+    columns: Tuple[SortColumn, ...]
+
+    def order_by(self) -> str:
+        return ', '.join(f"{col.expr} {'DESC' if col.descending else 'ASC'}" for col in self.columns)
+
+
+def encode_cursor(sort: SortSpec, row: Dict[str, Any]) -> str:
+    """結果行から次ページ用のカーソルを作成"""
+    payload = {'s': sort.name, 'v': [row[col.key] for col in sort.columns]}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(sort: SortSpec, token: Optional[str]) -> Optional[List[Any]]:
+    """カーソルをキー値のリストに戻す（無指定なら None）"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorError('カーソルが不正です')
+
+    # JSON としては正しくてもオブジェクト以外（配列・数値など）やキー値が SQL に渡せない型なら不正
+    if not isinstance(payload, dict):
+        raise InvalidCursorError('カーソルが不正です')
+    values = payload.get('v')
+    if payload.get('s') != sort.name or not isinstance(values, list) or len(values) != len(sort.columns):
+        raise InvalidCursorError('カーソルの並び順が一致しません')
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise InvalidCursorError('カーソルが不正です')
+    return values
+
+
+def keyset_condition(sort: SortSpec, values: Sequence[Any]) -> Tuple[str, List[Any]]:
+    """
+    「values の行より後ろ」を表す WHERE 条件を作成
+
+    (a, b, id) の並びなら a が後ろ、または a が同じで (b, id) が後ろ、を再帰的に組み立てる
+    """
+    condition, params = _after_condition(sort.columns, values)
+
+    # OR 条件だけだと索引を先頭から読むため、先頭列の範囲条件を重ねて途中から読ませる
+    col, value = sort.columns[0], values[0]
+    if value is not None and not col.nullable:
+        condition = f"{col.expr} {'<=' if col.descending else '>='} ? AND {condition}"
+        params = [value] + params
+    return condition, params
+
+
+def _after_condition(columns: Sequence[SortColumn], values: Sequence[Any]) -> Tuple[str, List[Any]]:
+    col, value = columns[0], values[0]
+
+    # この列だけで後ろになる条件
+    if value is None:
+        # NULL は昇順で先頭・降順で末尾
+        after, after_params = ((f"{col.expr} IS NOT NULL", []) if not col.descending else (None, []))
+    elif col.descending:
+        after = f"{col.expr} < ?" if not col.nullable else f"({col.expr} < ? OR {col.expr} IS NULL)"
+        after_params = [value]
+    else:
+        after, after_params = f"{col.expr} > ?", [value]
+
+    if len(columns) == 1:
+        return after or '0', after_params
+
+    equal, equal_params = ((f"{col.expr} IS NULL", []) if value is None else (f"{col.expr} = ?", [value]))
+    rest, rest_params = _after_condition(columns[1:], values[1:])
+    tie = f"({equal} AND {rest})"
+
+    if after is None:
+        return tie, equal_params + rest_params
+    return f"({after} OR {tie})", after_params + equal_params + rest_params
+
+
+def clamp_limit(limit: Optional[int], default: int, maximum: int) -> int:
+    """ページサイズを 1〜maximum に収める"""
+    if not limit or limit < 1:
+        return default
+    return min(limit, maximum)
@@ -0,0 +1,148 @@
+"""
+素材エイリアス解決モジュール
+- material_price_map.json から起動時に1回だけエイリアス表を構築
+- 大文字小文字・全角半角・空白を正規化し、複合素材（k18/pt900 など）のキーを事前計算
+- JSON の更新を検知してスナップショットを丸ごと差し替える（処理中のリクエストは旧スナップショットを使い続ける）
+"""
+
+import json
+import os
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+import pandas as pd
+
+MATERIAL_MAP_PATH = os.path.join(os.path.dirname(__file__), 'material_price_map.json')
+
+# 複合素材の区切り文字
+COMPOSITE_SEPARATOR = '/'
+
+
+def normalize_material(value: Any) -> str:
+    """素材名を正規化（NFKC で全角→半角、小文字化、空白除去）"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    text = unicodedata.normalize('NFKC', str(value)).lower()
+    return ''.join(text.split())
+
+
+class MaterialAliasSnapshot:
+    """ある時点のエイリアス表（不変オブジェクトとして扱う）"""
+
+    def __init__(self, alias_to_main: Dict[str, str], mtime: float = 0.0):
+        self.alias_to_main = alias_to_main
+        self.mtime = mtime
+        self.material_key = lru_cache(maxsize=4096)(self._material_key)
+
+        # 単一素材のキーは事前計算しておく
+        for alias in alias_to_main:
+            self.material_key(alias)
+
+    @classmethod
+    def from_json(cls, json_path: str) -> 'MaterialAliasSnapshot':
+        """素材価格マップ JSON からスナップショットを作成"""
+        with open(json_path, encoding='utf-8') as f:
+            raw = json.load(f)
+
+        alias_to_main = {}
+        for main, aliases in raw.items():
+            for alias in aliases:
+                alias_to_main[normalize_material(alias)] = normalize_material(main)
+        return cls(alias_to_main, os.path.getmtime(json_path))
+
+    def _material_key(self, normalized: str) -> Optional[Tuple[str, ...]]:
+        """
+        正規化済み素材名を主素材名のタプルに変換
+
+        単一素材は要素1つ、複合素材は構成素材ごとの要素を持つ。
+        1つでも未知の素材が含まれる場合は None。
+        """
+        if COMPOSITE_SEPARATOR in normalized:
+            mains = tuple(self.alias_to_main.get(part) for part in normalized.split(COMPOSITE_SEPARATOR))
+            return None if None in mains else mains
+        main = self.alias_to_main.get(normalized)
+        return (main,) if main is not None else None
+
+    @staticmethod
+    def _price_for_key(key: Optional[Tuple[str, ...]], price_table: Dict[str, float]) -> float:
+        """素材キーを単価に変換（複合素材は構成素材の平均、相場表に無い素材を含めば 0）"""
+        if key is None:
+            return 0.0
+        prices = [price_table.get(main) for main in key]
+        if None in prices:
+            return 0.0
+        return float(np.mean(prices)) if len(prices) > 1 else float(prices[0])
+
+    def resolve_price(self, material: Any, price_table: Dict[str, float]) -> float:
+        """素材1件を単価に解決（未知の素材は 0）"""
+        return self._price_for_key(self.material_key(normalize_material(material)), price_table)
+
+    def resolve_prices(self, materials: pd.Series, price_table: Dict[str, float]) -> np.ndarray:
+        """素材列をまとめて単価列に変換（ユニーク値ごとに解決し、コード配列で一括参照）"""
+        codes, uniques = pd.factorize(materials)
+        resolved = np.array(
+            [self.resolve_price(material, price_table) for material in uniques] + [0.0],
+            dtype=float
+        )
+        # 欠損値のコード -1 は末尾の 0.0 を参照する
+        return resolved[codes]
+
+    def resolve_price_matrix(self, materials: pd.Series, price_tables: List[Dict[str, float]]) -> np.ndarray:
+        """素材列を複数の相場表で一括解決し、アイテム × 相場表 の単価行列を返す"""
+        codes, uniques = pd.factorize(materials)
+        keys = [self.material_key(normalize_material(material)) for material in uniques]
+
+        # 末尾の行は欠損値（コード -1）用の 0.0
+        matrix = np.zeros((len(uniques) + 1, len(price_tables)), dtype=float)
+        for column, price_table in enumerate(price_tables):
+            matrix[:-1, column] = [self._price_for_key(key, price_table) for key in keys]
+        return matrix[codes]
+
+
+class MaterialResolver:
+    """エイリアス表の読み込みとホットリロードを管理"""
+
+    def __init__(self, json_path: str = MATERIAL_MAP_PATH, check_interval: float = 2.0):
+        self.json_path = json_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = MaterialAliasSnapshot.from_json(json_path)
+        self._last_checked = time.monotonic()
+
+    def snapshot(self) -> MaterialAliasSnapshot:
+        """現在のスナップショットを取得（必要に応じて JSON の更新を確認）"""
+        if time.monotonic() - self._last_checked >= self.check_interval:
+            self.reload_if_changed()
+        return self._snapshot
+
+    def reload_if_changed(self) -> bool:
+        """JSON が更新されていればスナップショットを差し替える"""
+        with self._lock:
+            self._last_checked = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.json_path)
+            except OSError as e:
+                print(f"⚠️ 素材マップの確認に失敗しました: {e}")
+                return False
+
+            if mtime == self._snapshot.mtime:
+                return False
+
+            try:
+                snapshot = MaterialAliasSnapshot.from_json(self.json_path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 素材マップの再読み込みに失敗しました（旧データを継続使用）: {e}")
+                return False
+
+            # 参照の差し替えは原子的に行われる
+            self._snapshot = snapshot
+            print(f"🔄 素材マップを再読み込みしました: {len(snapshot.alias_to_main)}件のエイリアス")
+            return True
+
+
+# シングルトンインスタンス
+material_resolver = MaterialResolver()
@@ -6,10 +6,11 @@
 
 import sqlite3
 import json
-import re
 from datetime import datetime
 import traceback
 
+from weight_parser import parse_weight
+
 DATABASE_PATH = 'users.db'
 
 def normalize_box_id(box_id):
@@ -30,18 +31,6 @@ def normalize_box_id(box_id):
     except (ValueError, TypeError):
         return None
 
-def parse_weight(weight_text):
-    """重量テキストから数値を抽出"""
-    if not weight_text:
-        return None
-    try:
-        # "11.3g" や "11.3" から数値部分を抽出
-        weight_str = str(weight_text).strip()
-        cleaned = re.sub(r'[^0-9.]', '', weight_str.split('g')[0])
-        return float(cleaned) if cleaned else None
-    except (ValueError, TypeError):
-        return None
-
 def migrate_database():
     """データベース移行のメイン処理"""
     print("🚀 データベース移行を開始します...")
@@ -297,6 +286,7 @@ if __name__ == "__main__":
             print("   - users: ユーザー管理")
             print("   - calculations: 計算セッション")
             print("   - calculation_items: 個別アイテム")
+            print("   - calculation_summaries: 集計テーブル（アプリ起動時に作成）")
             print("   - calculation_summaries_view: 集計ビュー")
             
         else:
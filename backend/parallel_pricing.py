@@ -0,0 +1,121 @@
+"""
+並列価格計算モジュール
+- 大きなアイテム一覧をチャンクに分割し、常駐プロセスプールで価格計算
+- エイリアス表はワーカー起動時に1回だけ渡し、チャンクごとには送らない
+- 件数が閾値未満ならプロセス間通信のコストを避けてそのまま計算する
+- 既定では無効（PRICING_PARALLEL_WORKERS を2以上にしたときだけ使う）
+  spawn のワーカーは起動時に __main__（api.py）を読み込み直すため、プール起動に秒単位かかる。
+  api.py の import は DB に触らないが、1 vCPU では常駐後も単一プロセスより遅い
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from material_resolver import MaterialAliasSnapshot, material_resolver
+from pricing_engine import RESULT_COLUMNS, assign_result_columns, compute_item_values, price_items
+
+# ワーカープロセス数（1以下なら並列化しない。Cloud Run では os.cpu_count() が割り当て vCPU より多いことがあるため既定は1）
+PARALLEL_WORKERS = int(os.environ.get('PRICING_PARALLEL_WORKERS', 1))
+# この行数以上でプロセスプールを使う
+PARALLEL_MIN_ROWS = int(os.environ.get('PRICING_PARALLEL_MIN_ROWS', 50000))
+# 1タスクあたりの行数
+PARALLEL_CHUNK_ROWS = int(os.environ.get('PRICING_PARALLEL_CHUNK_ROWS', 10000))
+
+# ワーカー側で保持するエイリアス表
+_worker_snapshot = None
+
+# ワーカーに送る入力カラム
+_INPUT_COLUMNS = ['weight', 'material', 'misc']
+
+
+def _init_worker(alias_to_main: Dict[str, str]):
+    """ワーカー初期化: エイリアス表を受け取ってスナップショットを構築"""
+    global _worker_snapshot
+    _worker_snapshot = MaterialAliasSnapshot(alias_to_main)
+
+
+def _price_chunk(chunk: pd.DataFrame, price_table: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """ワーカーで1チャンク分の計算列を求める"""
+    return compute_item_values(chunk, price_table, _worker_snapshot)
+
+
+class ParallelPricer:
+    """常駐プロセスプールによる価格計算"""
+
+    def __init__(self, workers: int = PARALLEL_WORKERS, min_rows: int = PARALLEL_MIN_ROWS,
+                 chunk_rows: int = PARALLEL_CHUNK_ROWS):
+        self.workers = workers
+        self.min_rows = min_rows
+        self.chunk_rows = chunk_rows
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_snapshot = None
+
+    def _get_executor(self, snapshot: MaterialAliasSnapshot) -> ProcessPoolExecutor:
+        """プールを取得（未起動、またはエイリアス表が再読み込みされた場合は起動し直す）"""
+        with self._lock:
+            if self._executor is not None and self._executor_snapshot is not snapshot:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+            if self._executor is None:
+                # スレッドを持つWebサーバー内から fork しないよう spawn で起動
+                # （forkserver でも子プロセスは __main__ を読み込み直すため起動時間は変わらない）
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(snapshot.alias_to_main,)
+                )
+                self._executor_snapshot = snapshot
+                print(f"🚀 価格計算プロセスプールを起動しました: {self.workers}ワーカー")
+
+            return self._executor
+
+    def should_parallelize(self, row_count: int) -> bool:
+        return self.workers > 1 and row_count >= self.min_rows
+
+    def price_items(self, item_df: pd.DataFrame, price_table: Dict[str, float],
+                    snapshot: Optional[MaterialAliasSnapshot] = None) -> pd.DataFrame:
+        """
+        pricing_engine.price_items と同じ結果を返す（大きな入力のみ並列化）
+
+        チャンクは入力順の連続した範囲なので、結果は位置どおりに連結する。
+        箱番号・枝番順への並べ替えは finalize_result_df で行う。
+        """
+        if snapshot is None:
+            snapshot = material_resolver.snapshot()
+
+        if not self.should_parallelize(len(item_df)):
+            return price_items(item_df, price_table, snapshot)
+
+        executor = self._get_executor(snapshot)
+        inputs = item_df[_INPUT_COLUMNS]
+        futures = [
+            executor.submit(_price_chunk, inputs.iloc[start:start + self.chunk_rows], price_table)
+            for start in range(0, len(inputs), self.chunk_rows)
+        ]
+        results = [future.result() for future in futures]
+
+        values = {col: np.concatenate([result[col] for result in results]) for col in RESULT_COLUMNS}
+        return assign_result_columns(item_df, values)
+
+    def shutdown(self):
+        """プールを停止（ワーカー終了時）"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+                self._executor_snapshot = None
+
+
+# シングルトンインスタンス
+parallel_pricer = ParallelPricer()
+atexit.register(parallel_pricer.shutdown)
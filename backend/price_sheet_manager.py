@@ -0,0 +1,281 @@
+"""
+相場表（価格シート）管理モジュール
+- 相場表を内容ハッシュをIDとして calculations と同じDBに保存
+- 計算用の単価辞書はメモリ上にキャッシュし、price_sheet_id だけで計算できるようにする
+- 相場表はユーザー間で共有しない（同じ内容でもアップロードしたユーザーごとに price_sheet_owners で管理）
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Optional, Any
+
+import pandas as pd
+
+from calculation_manager_v3 import DATABASE_PATH
+from pricing_engine import build_price_table
+from sqlite_pool import get_connection
+
+
+class PriceSheetManager:
+    def __init__(self, db_path: str = DATABASE_PATH, max_cached_tables: int = 64):
+        self.db_path = db_path
+        self.max_cached_tables = max_cached_tables
+        self._table_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # テーブル作成は最初の接続時に1回だけ行う（import・生成だけでは DB ファイルに触らない）
+        self._table_lock = threading.RLock()
+        self._table_state = None
+
+    def _get_connection(self):
+        """データベース接続を取得（スレッドごとのプール接続。close() でプールに返却）"""
+        if self._table_state != 'ready':
+            with self._table_lock:
+                # 同じスレッドで作成中（_ensure_table 内の接続取得からの再入）なら何もしない
+                if self._table_state is None:
+                    self._table_state = 'running'
+                    try:
+                        self._ensure_table()
+                    finally:
+                        self._table_state = 'ready'
+        return get_connection(self.db_path)
+
+    def _ensure_table(self):
+        """price_sheets テーブルが無ければ作成"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS price_sheets (
+                    id TEXT PRIMARY KEY,
+                    name TEXT,
+                    sheet_data TEXT NOT NULL,
+                    material_count INTEGER,
+                    created_by INTEGER,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_price_sheets_created_at ON price_sheets(created_at)")
+            # 内容ハッシュが同じ相場表は1行にまとめるため、所有者（閲覧できるユーザー）は別テーブルで持つ
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS price_sheet_owners (
+                    sheet_id TEXT NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    name TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (sheet_id, user_id)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_price_sheet_owners_user
+                ON price_sheet_owners(user_id, created_at)
+            """)
+            # 既存の相場表は最初にアップロードしたユーザーの所有とする
+            conn.execute("""
+                INSERT OR IGNORE INTO price_sheet_owners (sheet_id, user_id, name, created_at)
+                SELECT id, created_by, name, created_at FROM price_sheets WHERE created_by IS NOT NULL
+            """)
+            conn.commit()
+        except Exception as e:
+            print(f"⚠️ price_sheets テーブル作成エラー: {e}")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def normalize_sheet(price_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        相場表を正規化（素材名の前後空白除去・単価の数値化・重複は後勝ち・素材名順）
+
+        同じ内容の相場表が同じハッシュになるようにするための前処理
+        """
+        price_df = pd.DataFrame(price_data, columns=['material', 'price'])
+        price_df = price_df[price_df['material'].notna()]
+        prices = pd.to_numeric(price_df['price'], errors='coerce').fillna(0)
+
+        merged = {}
+        for material, price in zip(price_df['material'].astype(str).str.strip(), prices):
+            if material:
+                merged[material] = float(price)
+
+        return [{'material': material, 'price': merged[material]} for material in sorted(merged)]
+
+    @staticmethod
+    def compute_sheet_id(normalized_sheet: List[Dict[str, Any]]) -> str:
+        """正規化済み相場表の内容ハッシュ（SHA-256）"""
+        payload = json.dumps(normalized_sheet, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def upload_price_sheet(self, price_data: List[Dict[str, Any]], user_id: int = None, name: str = None) -> Optional[Dict]:
+        """
+        相場表を保存（同じ内容が既にあれば既存のIDを返す）
+
+        Args:
+            price_data: material / price を持つ辞書のリスト
+            user_id: アップロードしたユーザーID（このユーザーだけが一覧・取得できる）
+            name: 表示用の名前
+
+        Returns:
+            相場表の概要（id, name, material_count, created_by, created_at, created）
+            created はこのユーザーにとって新規の相場表かどうか
+        """
+        normalized = self.normalize_sheet(price_data)
+        if not normalized:
+            return None
+
+        sheet_id = self.compute_sheet_id(normalized)
+        name = name or f"相場表_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        created_at = datetime.now().isoformat()
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR IGNORE INTO price_sheets (id, name, sheet_data, material_count, created_by, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                sheet_id,
+                name,
+                json.dumps(normalized, ensure_ascii=False),
+                len(normalized),
+                user_id,
+                created_at
+            ))
+            created = cursor.rowcount > 0
+            if user_id is not None:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO price_sheet_owners (sheet_id, user_id, name, created_at)
+                    VALUES (?, ?, ?, ?)
+                """, (sheet_id, user_id, name, created_at))
+                created = cursor.rowcount > 0
+            conn.commit()
+
+            if user_id is not None:
+                cursor.execute("""
+                    SELECT s.id, o.name, s.material_count, o.user_id AS created_by, o.created_at
+                    FROM price_sheets s
+                    JOIN price_sheet_owners o ON o.sheet_id = s.id
+                    WHERE s.id = ? AND o.user_id = ?
+                """, (sheet_id, user_id))
+            else:
+                cursor.execute("""
+                    SELECT id, name, material_count, created_by, created_at
+                    FROM price_sheets WHERE id = ?
+                """, (sheet_id,))
+            summary = dict(cursor.fetchone())
+            summary['created'] = created
+
+            self._cache_table(sheet_id, build_price_table(pd.DataFrame(normalized)))
+            return summary
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ 相場表保存エラー: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def list_price_sheets(self, user_id: int, limit: int = 50) -> List[Dict]:
+        """ユーザーがアップロードした相場表の一覧を新しい順に取得（内容は含まない）"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT s.id, o.name, s.material_count, o.user_id AS created_by, o.created_at
+                FROM price_sheet_owners o
+                JOIN price_sheets s ON s.id = o.sheet_id
+                WHERE o.user_id = ?
+                ORDER BY o.created_at DESC
+                LIMIT ?
+            """, (user_id, limit))
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"❌ 相場表一覧取得エラー: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def get_price_sheet(self, sheet_id: str, user_id: Optional[int]) -> Optional[Dict]:
+        """
+        相場表を内容付きで取得
+
+        Args:
+            sheet_id: 相場表ID（内容ハッシュ）
+            user_id: 取得するユーザーID。そのユーザーがアップロードしていなければ None を返す
+                     （None を渡すと所有者を確認しない。バッチ CLI などサーバー内部用）
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            if user_id is None:
+                cursor.execute("""
+                    SELECT id, name, sheet_data, material_count, created_by, created_at
+                    FROM price_sheets WHERE id = ?
+                """, (sheet_id,))
+            else:
+                cursor.execute("""
+                    SELECT s.id, o.name, s.sheet_data, s.material_count, o.user_id AS created_by, o.created_at
+                    FROM price_sheets s
+                    JOIN price_sheet_owners o ON o.sheet_id = s.id
+                    WHERE s.id = ? AND o.user_id = ?
+                """, (sheet_id, user_id))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            sheet = dict(row)
+            sheet['price_data'] = json.loads(sheet.pop('sheet_data'))
+            return sheet
+        except Exception as e:
+            print(f"❌ 相場表取得エラー: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def _is_owner(self, sheet_id: str, user_id: int) -> bool:
+        """ユーザーがその相場表をアップロードしているか"""
+        conn = self._get_connection()
+        try:
+            row = conn.execute("""
+                SELECT 1 FROM price_sheet_owners WHERE sheet_id = ? AND user_id = ?
+            """, (sheet_id, user_id)).fetchone()
+            return row is not None
+        except Exception as e:
+            print(f"❌ 相場表所有者確認エラー: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def get_price_table(self, sheet_id: str, user_id: Optional[int]) -> Optional[Dict[str, float]]:
+        """
+        計算用の単価辞書を取得（内容ハッシュがキーなのでキャッシュは無効化不要）
+
+        user_id の扱いは get_price_sheet と同じ（キャッシュ済みでも所有者は毎回確認する）
+        """
+        if user_id is not None and not self._is_owner(sheet_id, user_id):
+            return None
+
+        with self._cache_lock:
+            table = self._table_cache.get(sheet_id)
+            if table is not None:
+                self._table_cache.move_to_end(sheet_id)
+                return table
+
+        sheet = self.get_price_sheet(sheet_id, None)
+        if not sheet:
+            return None
+
+        table = build_price_table(pd.DataFrame(sheet['price_data'], columns=['material', 'price']))
+        self._cache_table(sheet_id, table)
+        return table
+
+    def _cache_table(self, sheet_id: str, table: Dict[str, float]):
+        """単価辞書をLRUキャッシュに登録"""
+        with self._cache_lock:
+            self._table_cache[sheet_id] = table
+            self._table_cache.move_to_end(sheet_id)
+            while len(self._table_cache) > self.max_cached_tables:
+                self._table_cache.popitem(last=False)
+
+
+# シングルトンインスタンス
+price_sheet_manager = PriceSheetManager()
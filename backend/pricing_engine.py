@@ -0,0 +1,132 @@
+"""
+列指向の価格計算エンジン
+- 旧 calculate_items の行単位 apply を pandas/NumPy の列演算に置き換え
+- api.py の calculate_fixed やバッチ処理から共通で利用する
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+from material_resolver import MaterialAliasSnapshot, material_resolver, normalize_material
+from weight_parser import parse_weights
+from gemstone_estimator import estimate_gemstone_weights
+
+# 計算結果として付与するカラム（旧 calculate_items と同じ順序）
+RESULT_COLUMNS = ['jewelry_price', 'material_price', 'total_weight', 'gemstone_weight', 'material_weight']
+
+# 計算に必要な入力カラム（無ければ None で補完）
+REQUIRED_ITEM_COLUMNS = ['box_id', 'box_no', 'material', 'misc', 'weight', 'brand_name']
+
+# calculate-fixed の出力カラム
+CALCULATION_OUTPUT_COLUMNS = [
+    'box_id', 'box_no', 'material', 'brand_name', 'misc', 'weight',
+    'jewelry_price', 'material_price', 'total_weight',
+    'gemstone_weight', 'material_weight'
+]
+
+
+def build_price_table(price_df: pd.DataFrame) -> Dict[str, float]:
+    """相場表から「正規化済み主素材名 → 単価」の辞書を作成"""
+    prices = pd.to_numeric(price_df['price'], errors='coerce').fillna(0)
+    return {
+        normalize_material(material): float(price)
+        for material, price in zip(price_df['material'], prices)
+    }
+
+
+def compute_item_values(item_df: pd.DataFrame, price_table: Dict[str, float],
+                        snapshot: MaterialAliasSnapshot) -> Dict[str, np.ndarray]:
+    """アイテム一覧から RESULT_COLUMNS の各列を配列として計算"""
+    total_weight = parse_weights(item_df['weight']).fillna(0.0).to_numpy(dtype=float)
+    material_price = snapshot.resolve_prices(item_df['material'], price_table)
+    gemstone_weight = estimate_gemstone_weights(item_df['misc'])
+
+    material_weight = total_weight - gemstone_weight
+    return {
+        'jewelry_price': material_weight * material_price,
+        'material_price': material_price,
+        'total_weight': total_weight,
+        'gemstone_weight': gemstone_weight,
+        'material_weight': material_weight
+    }
+
+
+def assign_result_columns(item_df: pd.DataFrame, values: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """item_df のコピーに計算結果の列を付与"""
+    result_df = item_df.copy()
+    for col in RESULT_COLUMNS:
+        result_df[col] = values[col]
+    return result_df
+
+
+def price_items(item_df: pd.DataFrame, price_table: Dict[str, float],
+                snapshot: Optional[MaterialAliasSnapshot] = None) -> pd.DataFrame:
+    """
+    アイテム一覧の価格計算を列演算で実行
+
+    Args:
+        item_df: weight / material / misc カラムを含むアイテムデータ
+        price_table: build_price_table で作成した単価辞書
+        snapshot: 使用するエイリアス表（省略時は現在のスナップショット）
+
+    Returns:
+        item_df のコピーに RESULT_COLUMNS を付与したもの
+    """
+    if snapshot is None:
+        snapshot = material_resolver.snapshot()
+
+    return assign_result_columns(item_df, compute_item_values(item_df, price_table, snapshot))
+
+
+def price_scenarios(item_df: pd.DataFrame, price_tables: List[Dict[str, float]],
+                    snapshot: Optional[MaterialAliasSnapshot] = None) -> Dict[str, np.ndarray]:
+    """
+    複数の相場表で同時に価格計算（重量解析・素材解決は1回だけ）
+
+    Args:
+        item_df: weight / material / misc カラムを含むアイテムデータ
+        price_tables: シナリオごとの単価辞書
+        snapshot: 使用するエイリアス表（省略時は現在のスナップショット）
+
+    Returns:
+        total_weight / gemstone_weight / material_weight（各アイテム）と
+        material_prices / values（アイテム × シナリオ の行列）
+    """
+    if snapshot is None:
+        snapshot = material_resolver.snapshot()
+
+    total_weight = parse_weights(item_df['weight']).fillna(0.0).to_numpy(dtype=float)
+    gemstone_weight = estimate_gemstone_weights(item_df['misc'])
+    material_weight = total_weight - gemstone_weight
+
+    material_prices = snapshot.resolve_price_matrix(item_df['material'], price_tables)
+    return {
+        'total_weight': total_weight,
+        'gemstone_weight': gemstone_weight,
+        'material_weight': material_weight,
+        'material_prices': material_prices,
+        'values': material_weight[:, np.newaxis] * material_prices
+    }
+
+
+def prepare_item_df(item_df: pd.DataFrame) -> pd.DataFrame:
+    """入力整形: 空文字の重量を None にし、必要カラムを補完"""
+    if 'weight' in item_df.columns:
+        blank_weights = item_df['weight'].astype(str).str.strip() == ""
+        item_df.loc[blank_weights, 'weight'] = None
+
+    for col in REQUIRED_ITEM_COLUMNS:
+        if col not in item_df.columns:
+            item_df[col] = None
+    return item_df
+
+
+def finalize_result_df(result_df: pd.DataFrame, sort: bool = True) -> pd.DataFrame:
+    """出力整形: 箱番号・枝番を整数化し、箱番号順に並べて出力カラムに絞る"""
+    result_df['box_no'] = pd.to_numeric(result_df['box_no'], errors='coerce').fillna(0).astype(int)
+    result_df['box_id'] = pd.to_numeric(result_df['box_id'], errors='coerce').fillna(0).astype(int)
+    if sort:
+        result_df = result_df.sort_values(by=['box_id', 'box_no'])
+
+    return result_df[[col for col in CALCULATION_OUTPUT_COLUMNS if col in result_df.columns]]
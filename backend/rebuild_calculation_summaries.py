@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+計算集計テーブル（calculation_summaries）の再構築スクリプト
+- 既存DBへの導入時や、手作業でアイテムを書き換えた後の不整合修復に使う
+- 通常の保存・更新・再計算・削除では CalculationManagerV3 が集計を更新するため実行不要
+
+使い方:
+    python rebuild_calculation_summaries.py
+    python rebuild_calculation_summaries.py --db ./users.db --verify
+"""
+
+import argparse
+import sys
+
+# calculation_manager_v3.DATABASE_PATH と同じ（--help だけで DB モジュールを読み込まないよう直接持つ）
+DEFAULT_DB_PATH = 'users.db'
+
+
+def verify_summaries(manager) -> int:
+    """
+    集計テーブルを calculation_items から集計し直した結果と全件比較し、不一致の件数を返す
+
+    - アイテムのある計算: 集計行が無い・値が違う
+    - アイテムの無い計算: 集計行が残っている（再構築・更新では作られない）
+    - 計算が存在しない集計行
+    """
+    conn = manager._get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            WITH expected AS (
+                SELECT
+                    calculation_id,
+                    COUNT(*) as total_items,
+                    COALESCE(SUM(jewelry_price), 0) as total_value,
+                    COALESCE(SUM(total_weight), 0) as total_weight,
+                    COUNT(DISTINCT box_id) as unique_boxes,
+                    COALESCE(AVG(jewelry_price), 0) as average_item_value,
+                    MIN(created_at) as first_item_created,
+                    MAX(created_at) as last_item_created
+                FROM calculation_items
+                GROUP BY calculation_id
+            )
+            SELECT
+                (
+                    SELECT COUNT(*) FROM calculations c
+                    LEFT JOIN expected e ON e.calculation_id = c.id
+                    LEFT JOIN calculation_summaries s ON s.calculation_id = c.id
+                    WHERE (e.calculation_id IS NULL) != (s.calculation_id IS NULL)
+                       OR s.total_items != e.total_items
+                       OR ABS(s.total_value - e.total_value) > 1e-6
+                       OR ABS(s.total_weight - e.total_weight) > 1e-6
+                       OR s.unique_boxes != e.unique_boxes
+                       OR ABS(s.average_item_value - e.average_item_value) > 1e-6
+                       OR s.first_item_created IS NOT e.first_item_created
+                       OR s.last_item_created IS NOT e.last_item_created
+                ) + (
+                    SELECT COUNT(*) FROM calculation_summaries s
+                    WHERE NOT EXISTS (SELECT 1 FROM calculations c WHERE c.id = s.calculation_id)
+                )
+        """)
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='calculation_summaries テーブルを再構築します')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='データベースファイル')
+    parser.add_argument('--verify', action='store_true', help='再構築せずに不一致の件数だけ確認する')
+    args = parser.parse_args(argv)
+
+    from calculation_manager_v3 import CalculationManagerV3
+    manager = CalculationManagerV3(db_path=args.db)
+
+    if args.verify:
+        mismatches = verify_summaries(manager)
+        if mismatches:
+            print(f"⚠️ 集計の不一致: {mismatches}件（--verify なしで再構築してください）")
+            return 1
+        print("✅ 集計テーブルは最新です")
+        return 0
+
+    return 0 if manager.rebuild_calculation_summaries() >= 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+計算履歴の読み取り応答キャッシュモジュール
+- 履歴一覧・詳細・箱グループ・統計の JSON 本文を ETag（ユーザー・計算・版番号・クエリ）単位で保持
+- 版番号は DB にあり書き込みごとに進むため、古い版のエントリは参照されない（ワーカー間でも整合する）
+- 書き込み時は該当ユーザー・計算のエントリを明示的に削除してメモリを空ける
+- 記憶域・統計は ResultCache と共通（メモリ層はバイト数上限付き LRU、ディスク層は任意）
+"""
+
+import os
+from typing import Iterable, Optional
+
+from result_cache import ResultCache
+
+# メモリ層の上限（JSON 本文のバイト数）
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+# ディスク層のディレクトリ（未設定ならディスク層を使わない。同一インスタンスの全ワーカーで共有）
+RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR') or None
+RESPONSE_CACHE_DISK_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+
+
+def _scope_prefix(user_id: int, calculation_id: Optional[int] = None) -> str:
+    """キーの接頭辞（calculation_id が None ならユーザー単位の一覧・統計）"""
+    return f"u{user_id}-c{'all' if calculation_id is None else calculation_id}-"
+
+
+def response_cache_key(user_id: int, calculation_id: Optional[int], etag: str) -> str:
+    """ユーザー・計算ごとに削除できるよう接頭辞を付けたキー"""
+    return _scope_prefix(user_id, calculation_id) + etag
+
+
+def invalidate_calculations(user_id: int, calculation_ids: Iterable[int] = ()) -> int:
+    """書き込み時: ユーザー単位のエントリと、変更された計算のエントリを削除"""
+    prefixes = [_scope_prefix(user_id)] + [_scope_prefix(user_id, calculation_id) for calculation_id in calculation_ids]
+    return response_cache.invalidate_prefix(prefixes)
+
+
+# シングルトンインスタンス
+response_cache = ResultCache(
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    disk_dir=RESPONSE_CACHE_DIR,
+    disk_max_bytes=RESPONSE_CACHE_DISK_MAX_BYTES
+)
@@ -0,0 +1,231 @@
+"""
+計算結果キャッシュモジュール
+- 同じアイテムデータ・相場・エイリアス表での calculate-fixed / calculate-and-save の再計算を省く
+- キーは正規化したアイテムデータ（行ハッシュ）と単価辞書の SHA-256
+- メモリ層はバイト数上限付きの LRU、ディスク層（任意）は同一インスタンスの全ワーカーで共有
+- ヒット・ミス数と節約できた計算時間を集計
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+# メモリ層の上限（pickle 後のバイト数）
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# ディスク層のディレクトリ（未設定ならディスク層を使わない）
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+# ディスク層の上限
+RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get('RESULT_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
+
+_ENTRY_SUFFIX = '.pkl'
+
+
+def compute_cache_key(item_df: pd.DataFrame, price_table: Dict[str, float], alias_version: float) -> str:
+    """アイテムデータ・単価辞書・エイリアス表の版からキャッシュキーを作成"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(map(str, item_df.columns)), ensure_ascii=False).encode('utf-8'))
+    # 行ごとのハッシュを列演算で求めてまとめる（JSON 化するより高速）
+    digest.update(pd.util.hash_pandas_object(item_df, index=False).to_numpy().tobytes())
+    digest.update(json.dumps(sorted(price_table.items()), ensure_ascii=False).encode('utf-8'))
+    digest.update(repr(alias_version).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """バイト数上限付き LRU（メモリ）＋ 任意のディスク層"""
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, disk_dir: Optional[str] = RESULT_CACHE_DIR,
+                 disk_max_bytes: int = RESULT_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'saved_seconds': 0.0
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    # --- メモリ層 ---
+
+    def _memory_get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _memory_put(self, key: str, payload: bytes, compute_seconds: float):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = (payload, compute_seconds)
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats['evictions'] += 1
+
+    # --- ディスク層 ---
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + _ENTRY_SUFFIX)
+
+    def _disk_get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                compute_seconds, payload = pickle.load(f)
+            # 最終利用時刻を更新（ディスク層の LRU 判定に使う）
+            os.utime(path)
+            return payload, compute_seconds
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _disk_put(self, key: str, payload: bytes, compute_seconds: float):
+        if not self.disk_dir or len(payload) > self.disk_max_bytes:
+            return
+        # 他のワーカーが読みかけのファイルを壊さないよう一時ファイルから置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((compute_seconds, payload), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            print(f"⚠️ 計算結果キャッシュのディスク書き込みに失敗しました: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._disk_evict()
+
+    def _disk_evict(self):
+        """ディスク層が上限を超えたら最終利用が古いものから削除"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(_ENTRY_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.disk_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        for _, size, name in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+                total -= size
+                with self._lock:
+                    self._stats['evictions'] += 1
+            except FileNotFoundError:
+                continue
+
+    def _may_fit(self, result: Any) -> bool:
+        """保存先のどちらかに収まる可能性があるか（大きすぎる DataFrame を pickle する前に弾く）"""
+        if not isinstance(result, pd.DataFrame):
+            return True
+        limit = max(self.max_bytes, self.disk_max_bytes if self.disk_dir else 0)
+        return int(result.memory_usage(deep=True).sum()) <= limit
+
+    # --- 公開 API ---
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        キャッシュにあれば復元し、無ければ計算して保存（compute が None を返した場合は保存しない）
+
+        返す DataFrame は毎回新しいオブジェクトなので、呼び出し側で変更してよい
+        """
+        entry = self._memory_get(key)
+        tier = 'memory_hits'
+        if entry is None:
+            entry = self._disk_get(key)
+            tier = 'disk_hits'
+            if entry is not None:
+                self._memory_put(key, *entry)
+
+        if entry is not None:
+            payload, compute_seconds = entry
+            with self._lock:
+                self._stats[tier] += 1
+                self._stats['saved_seconds'] += compute_seconds
+            return pickle.loads(payload)
+
+        started = time.perf_counter()
+        result_df = compute()
+        compute_seconds = time.perf_counter() - started
+        if result_df is None:
+            return None
+
+        with self._lock:
+            self._stats['misses'] += 1
+
+        # 上限を明らかに超える結果は pickle せずにそのまま返す（サイズ確認だけのためのコピーを作らない）
+        if self._may_fit(result_df):
+            payload = pickle.dumps(result_df, protocol=pickle.HIGHEST_PROTOCOL)
+            self._memory_put(key, payload, compute_seconds)
+            self._disk_put(key, payload, compute_seconds)
+        return result_df
+
+    def stats(self) -> Dict:
+        """ヒット率などの集計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = hits / lookups if lookups else 0.0
+        stats['max_bytes'] = self.max_bytes
+        stats['disk_enabled'] = bool(self.disk_dir)
+        return stats
+
+    def invalidate_prefix(self, prefixes: Iterable[str]) -> int:
+        """キーが prefixes のいずれかで始まるエントリをメモリ層・ディスク層から削除"""
+        prefixes = tuple(prefixes)
+        removed = 0
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefixes)]:
+                self._bytes -= len(self._entries.pop(key)[0])
+                removed += 1
+
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(_ENTRY_SUFFIX) and name.startswith(prefixes):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                        removed += 1
+                    except FileNotFoundError:
+                        continue
+        return removed
+
+    def clear(self):
+        """メモリ層を空にする（ディスク層は残す）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# シングルトンインスタンス
+result_cache = ResultCache()
@@ -0,0 +1,192 @@
+"""
+SQLite 接続プールモジュール
+- 使い終わった接続を閉じずに待機リストへ戻し、次の取得で使い回す（メソッド呼び出しごとの connect をやめる）
+- 同じスレッド内の入れ子の取得は同じ接続を返し、最も外側の close() でだけ未コミット分を破棄して返却する
+  （リクエストごとにスレッドを作る開発サーバーでも、返却された接続を次のスレッドが再利用する）
+- WAL モードで読み込みが書き込みを待たないようにし、キャッシュ・mmap などの PRAGMA を設定
+- foreign_keys=ON により ON DELETE CASCADE を有効化（delete_calculation が依存）
+- 返却されないまま終了したスレッドの接続は、待機リストが空のときに回収する
+- プロセス終了時にすべての接続を閉じる
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Set
+
+# PRAGMA 設定（環境変数で調整可能）
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+# 負の値は KiB 単位（-65536 = 64MB）
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -65536))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+# プリペアドステートメントのキャッシュ数（既定は 128）
+SQLITE_CACHED_STATEMENTS = int(os.environ.get('SQLITE_CACHED_STATEMENTS', 512))
+# 待機リストに残す接続数の上限（超えた分は返却時に閉じる）
+SQLITE_POOL_MAX_IDLE = int(os.environ.get('SQLITE_POOL_MAX_IDLE', 8))
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+    f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+)
+
+
+class PooledConnection:
+    """
+    プールの接続を包むラッパー（取得1回につき1つ）
+
+    既存コードの conn.close() はそのまま使え、接続を閉じずにプールへ返す。
+    入れ子で取得している間は外側の処理の未コミット分を残し、最も外側の close() でだけ
+    未コミットのトランザクションを破棄して次の利用に持ち越さない。
+    """
+
+    def __init__(self, pool: 'SQLitePool', conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._conn)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SQLitePool:
+    """DB ファイル1つ分の接続プール"""
+
+    def __init__(self, db_path: str, max_idle: int = SQLITE_POOL_MAX_IDLE):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        # スレッドごとの貸出中の接続と入れ子の深さ
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._idle: List[sqlite3.Connection] = []
+        # 貸出中の接続 → 借りているスレッドID（返却されずに終了したスレッドから回収するため）
+        self._owners: Dict[sqlite3.Connection, int] = {}
+        # 作成したすべての接続（終了時に閉じるために保持）
+        self._connections: Set[sqlite3.Connection] = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        # 接続はスレッドをまたいで返却・再利用する（同時に使うのは常に1スレッド）
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=SQLITE_CACHED_STATEMENTS
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _reclaim_dead_owners(self):
+        """返却されないまま終了したスレッドの接続を待機リストへ戻す（ロック取得済みで呼ぶ）"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for conn in [conn for conn, ident in self._owners.items() if ident not in alive]:
+            del self._owners[conn]
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.append(conn)
+
+    def connection(self) -> PooledConnection:
+        """現在のスレッドの接続を取得（貸出中でなければ待機リストから取り出すか作成）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._lock:
+                if not self._idle:
+                    self._reclaim_dead_owners()
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+                with self._lock:
+                    self._connections.add(conn)
+            with self._lock:
+                self._owners[conn] = threading.get_ident()
+            self._local.conn = conn
+            self._local.depth = 0
+        self._local.depth += 1
+        return PooledConnection(self, conn)
+
+    def _release(self, conn: sqlite3.Connection):
+        """取得1回分を返却し、最も外側なら未コミット分を破棄して待機リストへ戻す"""
+        if getattr(self._local, 'conn', None) is not conn:
+            # close_all() 後の返却、または別スレッドでの返却は接続を使い回さない
+            return
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._owners.pop(conn, None)
+            if conn in self._connections and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._connections.discard(conn)
+        conn.close()
+
+    def close_all(self):
+        """すべての接続を閉じる（ワーカー終了時）"""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+            self._idle.clear()
+            self._owners.clear()
+        self._local = threading.local()
+
+    def checkpoint(self):
+        """WAL の内容を本体ファイルへ書き戻す（DB ファイルをそのまま配布・バックアップする前に呼ぶ）"""
+        conn = self.connection()
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+
+
+_pools: Dict[str, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> SQLitePool:
+    """DB ファイルごとのプールを取得"""
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SQLitePool(db_path)
+            _pools[key] = pool
+        return pool
+
+
+def get_connection(db_path: str) -> PooledConnection:
+    """現在のスレッド用のプール接続を取得（使い終わったら close() で返却）"""
+    return get_pool(db_path).connection()
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+atexit.register(close_all_pools)
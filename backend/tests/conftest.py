@@ -0,0 +1,85 @@
+"""
+バックエンドのテスト共通設定
+- backend/ のモジュールをそのまま import できるようにする
+- モジュール読み込み時に作られるシングルトンが作業ディレクトリの users.db を触らないよう、一時ディレクトリで実行する
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp(prefix='mb-jewelry-tests-'))
+
+SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT DEFAULT 'user'
+);
+CREATE TABLE calculations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    calculation_name TEXT NOT NULL,
+    description TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+CREATE TABLE calculation_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    calculation_id INTEGER NOT NULL,
+    box_id INTEGER NOT NULL,
+    box_no INTEGER,
+    material TEXT,
+    weight_text TEXT,
+    weight_grams REAL,
+    misc TEXT,
+    jewelry_price REAL,
+    material_price REAL,
+    total_weight REAL,
+    gemstone_weight REAL,
+    material_weight REAL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    brand_name TEXT,
+    subcategory_name TEXT,
+    accessory_comment TEXT,
+    budget_lower REAL,
+    budget_upper REAL,
+    budget_reserve REAL,
+    frame_price REAL,
+    side_stone_price REAL,
+    live TEXT,
+    rank TEXT,
+    FOREIGN KEY (calculation_id) REFERENCES calculations (id) ON DELETE CASCADE
+);
+CREATE VIEW calculation_summaries_view AS
+SELECT calculation_id, COUNT(*) as total_items, COALESCE(SUM(jewelry_price), 0) as total_value,
+       COALESCE(SUM(total_weight), 0) as total_weight, COUNT(DISTINCT box_id) as unique_boxes,
+       COALESCE(AVG(jewelry_price), 0) as average_item_value,
+       MIN(created_at) as first_item_created, MAX(created_at) as last_item_created
+FROM calculation_items GROUP BY calculation_id;
+INSERT INTO users (username, password_hash, role) VALUES ('owner', 'x', 'user'), ('other', 'x', 'user');
+"""
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """3テーブル構造のスキーマを作成した一時DB"""
+    path = str(tmp_path / 'users.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def manager(db_path):
+    from calculation_manager_v3 import CalculationManagerV3
+    return CalculationManagerV3(db_path=db_path)
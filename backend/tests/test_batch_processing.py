@@ -0,0 +1,49 @@
+"""複数 CSV の一括処理: 入力の上限と結果 zip"""
+
+import io
+import json
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage, MultiDict
+
+import batch_processing
+from batch_processing import BatchInputError, calculate_batch, collect_batch_files
+
+HEADER = 'box_id,box_no,material,weight,misc,brand_name\n'
+
+
+def _csv(rows):
+    return (HEADER + ''.join(f'{n},1,K18,{n + 1}.0g,,\n' for n in range(rows))).encode('utf-8')
+
+
+def _request(members):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for name, content in members:
+            zf.writestr(name, content)
+    archive.seek(0)
+    return MultiDict([('archive', FileStorage(archive, filename='batch.zip'))])
+
+
+def test_total_size_limit_applies_to_extracted_members(monkeypatch):
+    monkeypatch.setattr(batch_processing, 'BATCH_MAX_TOTAL_BYTES', len(_csv(10)) * 2)
+
+    assert len(collect_batch_files(_request([('a.csv', _csv(10)), ('b.csv', _csv(10))]))) == 2
+    with pytest.raises(BatchInputError):
+        collect_batch_files(_request([('a.csv', _csv(10)), ('b.csv', _csv(10)), ('c.csv', _csv(1))]))
+
+
+def test_results_are_written_in_input_order(monkeypatch):
+    monkeypatch.setattr(batch_processing, 'BATCH_WORKERS', 2)
+    members = [(f'dir{n}/file.csv', _csv(n + 1)) for n in range(6)] + [('broken.csv', b'')]
+
+    archive_file, summary = calculate_batch(collect_batch_files(_request(members)), {'K18': 10000.0})
+
+    with zipfile.ZipFile(archive_file) as zf:
+        names = zf.namelist()
+        assert names[:3] == ['calculated_file.csv', 'calculated_file_2.csv', 'calculated_file_3.csv']
+        assert names[-1] == batch_processing.SUMMARY_FILENAME
+        assert zf.read(names[0]).startswith(b'\xef\xbb\xbf' + HEADER.encode('utf-8')[:6])
+        assert json.loads(zf.read(names[-1]))['failed'] == 1
+    assert [result['rows'] for result in summary['results'][:6]] == [1, 2, 3, 4, 5, 6]
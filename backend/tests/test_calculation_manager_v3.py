@@ -0,0 +1,83 @@
+"""CalculationManagerV3 のアイテム編集（ID指定・一括）"""
+
+import pytest
+
+
+def _save(manager, user_id=1, count=2):
+    items = [
+        {'box_id': 1, 'box_no': n, 'material': 'K18', 'weight': '1g', 'jewelry_price': 10}
+        for n in range(count)
+    ]
+    calculation_id = manager.save_calculation(user_id, 'テスト', items, {})
+    item_ids = [item['id'] for item in manager.get_calculation_items_page(calculation_id, user_id)['items']]
+    return calculation_id, item_ids
+
+
+def _item(manager, item_id):
+    conn = manager._get_connection()
+    try:
+        return dict(conn.execute("SELECT * FROM calculation_items WHERE id = ?", (item_id,)).fetchone())
+    finally:
+        conn.close()
+
+
+def test_bulk_update_later_edit_wins_across_column_sets(manager):
+    _, (item_id, _) = _save(manager)
+
+    result = manager.bulk_update_items(1, [
+        {'id': item_id, 'jewelry_price': 1},
+        {'id': item_id, 'jewelry_price': 2, 'material': 'pt900'},
+        {'id': item_id, 'jewelry_price': 3},
+    ])
+
+    assert result['updated_items'] == 1
+    item = _item(manager, item_id)
+    assert item['jewelry_price'] == 3
+    assert item['material'] == 'pt900'
+
+
+def test_bulk_update_refreshes_summary(manager):
+    calculation_id, item_ids = _save(manager)
+
+    manager.bulk_update_items(1, [{'id': item_id, 'jewelry_price': 100} for item_id in item_ids])
+
+    detail = manager.get_calculation_detail(calculation_id, 1, include_items=False)
+    assert detail['total_value'] == 200
+
+
+def test_bulk_update_rejects_items_of_other_users(manager):
+    _, (own_id, _) = _save(manager, user_id=1)
+    _, (foreign_id, _) = _save(manager, user_id=2)
+
+    assert manager.bulk_update_items(1, [{'id': own_id, 'misc': 'x'}, {'id': foreign_id, 'misc': 'x'}]) is None
+    assert _item(manager, own_id)['misc'] is None
+
+
+def test_bulk_update_raises_on_database_error(manager, monkeypatch):
+    _, (item_id, _) = _save(manager)
+
+    def broken_refresh(cursor, calculation_ids):
+        raise RuntimeError('disk I/O error')
+
+    monkeypatch.setattr(manager, '_refresh_summaries', broken_refresh)
+    with pytest.raises(RuntimeError):
+        manager.bulk_update_items(1, [{'id': item_id, 'jewelry_price': 5}])
+    assert _item(manager, item_id)['jewelry_price'] == 10
+
+
+def test_update_item_by_id_returns_none_for_other_users(manager):
+    _, (item_id, _) = _save(manager, user_id=2)
+
+    assert manager.update_item_by_id(item_id, 1, {'misc': 'x'}) is None
+
+
+def test_update_item_by_id_raises_on_database_error(manager, monkeypatch):
+    _, (item_id, _) = _save(manager)
+
+    def broken_refresh(cursor, calculation_ids):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(manager, '_refresh_summaries', broken_refresh)
+    with pytest.raises(RuntimeError):
+        manager.update_item_by_id(item_id, 1, {'jewelry_price': 5})
+    assert _item(manager, item_id)['jewelry_price'] == 10
@@ -0,0 +1,44 @@
+"""CSV 編集: ストリーミング出力と一括出力の一致"""
+
+import io
+
+import pytest
+
+import csv_ingest
+from csv_editing import edit_columns, iter_edited_chunks
+from csv_ingest import read_csv_upload
+from csv_streaming import UTF8_BOM, infer_column_dtypes, iter_csv_chunks, iter_frames_csv
+
+# 先頭ゼロの箱番・空欄を含む枝番（一括では 1.0）・整数値の重量・文字列が混じる列
+CSV_TEXT = (
+    'end_date,box_id,box_no,material,misc,weight,jewelry_carat,brand_name,accessory_comment\n'
+    '2024-01-05,001,1,K18,10,10,0.5,,箱\n'
+    '2024-01-05,002,,Pt900,,3.5,,CHANEL,\n'
+    '2024-01-05,010,3,K18,ダイヤ,10,1,,\n'
+    '2024-01-06,011,4,SV,7,2,,,保証書\n'
+    '2024-01-06,012,5,K18,8,10,2,,\n'
+)
+
+
+def _one_shot(data: bytes) -> str:
+    df, _ = read_csv_upload(io.BytesIO(data), log=False)
+    return UTF8_BOM + edit_columns(df).to_csv(index=False)
+
+
+def _streamed(data: bytes, chunk_rows: int) -> str:
+    file = io.BytesIO(data)
+    chunks = iter_csv_chunks(file, chunk_rows=chunk_rows, dtype=infer_column_dtypes(file, chunk_rows=chunk_rows))
+    return ''.join(iter_frames_csv(iter_edited_chunks(chunks)))
+
+
+@pytest.mark.parametrize('pyarrow', [True, False])
+@pytest.mark.parametrize('chunk_rows', [1, 2, 5])
+def test_streamed_edit_matches_one_shot(monkeypatch, pyarrow, chunk_rows):
+    if pyarrow:
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(csv_ingest, 'PYARROW_AVAILABLE', pyarrow)
+    data = CSV_TEXT.encode('utf-8')
+
+    expected = _one_shot(data)
+    assert _streamed(data, chunk_rows) == expected
+    assert '\n1,1.0,' in expected.replace('2024-01-05,', '')
@@ -0,0 +1,60 @@
+"""CSV 取り込み: pyarrow エンジンと C エンジンの結果の一致"""
+
+import io
+
+import pandas as pd
+import pytest
+
+import csv_ingest
+
+pytest.importorskip('pyarrow')
+
+SAMPLES = {
+    'auction': (
+        'box_id,box_no,material,weight,misc,brand_name,lot_date,lot_time,closed_at,jewelry_price,memo,empty\n'
+        '1,1,K18,3.5g,0.30 2.5mm,None,2024-01-05,10:30:00,2024-01-05 10:30:00,12000,<NA>,\n'
+        '1,2,Pt900,2g,,CHANEL,2024-01-06,11:00:00,2024-01-06 11:00:00,,NULL,\n'
+        '2,1,SV,10.0g,n/a,,2024-02-01,09:15:00,,8000.5,メモ,\n'
+    ),
+    'shift_jis_tab': (
+        'box_id\tbox_no\tmaterial\tweight\tbrand_name\tflag\n'
+        '1\t1\tK18\t1.0g\tカルティエ\ttrue\n'
+        '1\t2\tプラチナ\t2.0g\tNA\tFalse\n'
+    ),
+}
+
+
+def _read(monkeypatch, data: bytes, pyarrow: bool):
+    monkeypatch.setattr(csv_ingest, 'PYARROW_AVAILABLE', pyarrow)
+    return csv_ingest.read_csv_upload(io.BytesIO(data), log=False)
+
+
+@pytest.mark.parametrize('name', sorted(SAMPLES))
+def test_pyarrow_and_c_engine_return_equal_frames(monkeypatch, name):
+    text = SAMPLES[name]
+    data = text.encode('cp932' if name == 'shift_jis_tab' else 'utf-8')
+
+    arrow_df, arrow_ingest = _read(monkeypatch, data, pyarrow=True)
+    c_df, c_ingest = _read(monkeypatch, data, pyarrow=False)
+
+    assert arrow_ingest['engine'] == 'pyarrow'
+    assert c_ingest['engine'] == 'c'
+    pd.testing.assert_frame_equal(arrow_df, c_df)
+
+
+def test_pyarrow_keeps_dates_as_written(monkeypatch):
+    df, _ = _read(monkeypatch, SAMPLES['auction'].encode('utf-8'), pyarrow=True)
+
+    assert df['lot_date'].tolist() == ['2024-01-05', '2024-01-06', '2024-02-01']
+    assert df['closed_at'][0] == '2024-01-05 10:30:00'
+    assert df['memo'].isna().tolist() == [True, True, False]
+
+
+def test_pyarrow_rereads_dates_first_seen_after_sample(monkeypatch):
+    filler = ''.join(f'{n},1,K18,\n' for n in range(csv_ingest.SNIFF_BYTES // 10))
+    data = ('box_id,box_no,material,lot_date\n' + filler + '9,9,SV,2024-03-01\n').encode('utf-8')
+
+    df, _ = _read(monkeypatch, data, pyarrow=True)
+
+    assert df['lot_date'].iloc[-1] == '2024-03-01'
+    assert df['lot_date'].iloc[:-1].isna().all()
@@ -0,0 +1,49 @@
+"""CSV ストリーミング: チャンクごとの型推論に依存しない出力と外部マージソート"""
+
+import csv
+import io
+
+from csv_streaming import UTF8_BOM, iter_calculated_csv, iter_csv_chunks, iter_priced_chunks
+from material_resolver import material_resolver
+
+ROWS = ['1,1,K18,3,1.0g,7\n', '1,2,K18,,2.0g,\n', '2,1,K18,4,3.0g,8\n', '2,2,K18,5,1.5g,9\n']
+
+
+def _csv(rows):
+    return ('box_id,box_no,material,misc,weight,brand_name\n' + ''.join(rows)).encode('utf-8')
+
+
+def _stream(chunk_rows):
+    chunks = iter_csv_chunks(io.BytesIO(_csv(ROWS)), chunk_rows=chunk_rows)
+    priced = iter_priced_chunks(chunks, {'K18': 10000.0}, material_resolver.snapshot())
+    return ''.join(iter_calculated_csv(priced))
+
+
+def test_chunks_are_read_as_strings():
+    chunks = list(iter_csv_chunks(io.BytesIO(_csv(ROWS)), chunk_rows=2))
+
+    assert chunks[0]['misc'].iloc[0] == '3'
+    assert all(dtype == object for chunk in chunks for dtype in chunk.dtypes)
+
+
+def test_streamed_output_does_not_depend_on_chunk_boundaries():
+    single = _stream(len(ROWS))
+
+    assert _stream(1) == single
+    assert _stream(2) == single
+    misc = [row['misc'] for row in csv.DictReader(io.StringIO(single[len(UTF8_BOM):]))]
+    assert misc == ['3', '', '4', '5']
+
+
+def test_external_merge_matches_in_memory_sort():
+    rows = [f'{box},{no},K18,,1.0g,\n' for box, no in [(3, 2), (1, 2), (2, 1), (3, 1), (1, 1), (2, 2)]]
+
+    def stream(max_bytes):
+        chunks = iter_csv_chunks(io.BytesIO(_csv(rows)), chunk_rows=2)
+        priced = iter_priced_chunks(chunks, {'K18': 10000.0}, material_resolver.snapshot())
+        return ''.join(iter_calculated_csv(priced, max_bytes_in_memory=max_bytes))
+
+    in_memory = stream(1024 * 1024)
+    keys = [(row['box_id'], row['box_no']) for row in csv.DictReader(io.StringIO(in_memory[len(UTF8_BOM):]))]
+    assert keys == [('1', '1'), ('1', '2'), ('2', '1'), ('2', '2'), ('3', '1'), ('3', '2')]
+    assert stream(1) == in_memory
@@ -0,0 +1,39 @@
+"""キーセットページネーション: カーソルの往復と不正なカーソル"""
+
+import base64
+import json
+
+import pytest
+
+from keyset_pagination import InvalidCursorError, SortColumn, SortSpec, decode_cursor, encode_cursor
+
+SORT = SortSpec('created', (
+    SortColumn('c.created_at', 'created_at', descending=True),
+    SortColumn('c.id', 'id', descending=True, nullable=False),
+))
+
+
+def _token(payload):
+    raw = json.dumps(payload).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(SORT, {'created_at': '2024-01-05 10:30:00', 'id': 7})
+
+    assert decode_cursor(SORT, token) == ['2024-01-05 10:30:00', 7]
+    assert decode_cursor(SORT, '') is None
+
+
+@pytest.mark.parametrize('token', [
+    'not base64!',
+    _token([1]),
+    _token(1),
+    _token(None),
+    _token({'s': 'other', 'v': ['2024-01-05', 7]}),
+    _token({'s': 'created', 'v': ['2024-01-05']}),
+    _token({'s': 'created', 'v': [{'x': 1}, 7]}),
+])
+def test_malformed_cursors_raise_invalid_cursor(token):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(SORT, token)
@@ -0,0 +1,34 @@
+"""相場表: ユーザーごとの一覧・取得"""
+
+import pytest
+
+from price_sheet_manager import PriceSheetManager
+
+SHEET = [{'material': 'K18', 'price': 9000}, {'material': 'Pt900', 'price': 5000}]
+
+
+@pytest.fixture
+def sheets(db_path):
+    return PriceSheetManager(db_path=db_path)
+
+
+def test_sheets_are_visible_only_to_their_uploader(sheets):
+    sheet_id = sheets.upload_price_sheet(SHEET, user_id=1, name='owner')['id']
+
+    assert [sheet['id'] for sheet in sheets.list_price_sheets(1)] == [sheet_id]
+    assert sheets.list_price_sheets(2) == []
+    assert sheets.get_price_sheet(sheet_id, 1)['price_data'] == sorted(SHEET, key=lambda row: row['material'])
+    assert sheets.get_price_sheet(sheet_id, 2) is None
+    assert sheets.get_price_table(sheet_id, 2) is None
+    assert sheets.get_price_table(sheet_id, 1)
+
+
+def test_same_content_uploaded_by_another_user_gets_own_entry(sheets):
+    first = sheets.upload_price_sheet(SHEET, user_id=1, name='owner')
+    second = sheets.upload_price_sheet(SHEET, user_id=2, name='other')
+    again = sheets.upload_price_sheet(SHEET, user_id=2)
+
+    assert first['id'] == second['id'] == again['id']
+    assert (first['created'], second['created'], again['created']) == (True, True, False)
+    assert sheets.get_price_sheet(second['id'], 2)['name'] == 'other'
+    assert sheets.get_price_sheet(first['id'], 1)['name'] == 'owner'
@@ -0,0 +1,53 @@
+"""集計テーブルの検証: 全件比較"""
+
+import sqlite3
+
+from rebuild_calculation_summaries import verify_summaries
+
+
+def _save(manager, user_id=1, count=2):
+    items = [{'box_id': n, 'box_no': 1, 'material': 'K18', 'weight': '1g', 'jewelry_price': 10} for n in range(count)]
+    return manager.save_calculation(user_id, 'テスト', items, {})
+
+
+def _execute(manager, sql, params=()):
+    conn = manager._get_connection()
+    try:
+        conn.execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_consistent_summaries_verify_clean(manager):
+    _save(manager)
+    _save(manager, count=0)
+
+    assert verify_summaries(manager) == 0
+
+
+def test_value_mismatch_is_reported(manager):
+    calculation_id = _save(manager)
+    _execute(manager, "UPDATE calculation_summaries SET total_value = 1 WHERE calculation_id = ?", (calculation_id,))
+
+    assert verify_summaries(manager) == 1
+
+
+def test_stale_summary_of_calculation_without_items_is_reported(manager):
+    calculation_id = _save(manager)
+    _execute(manager, "DELETE FROM calculation_items WHERE calculation_id = ?", (calculation_id,))
+
+    assert verify_summaries(manager) == 1
+    manager.rebuild_calculation_summaries()
+    assert verify_summaries(manager) == 0
+
+
+def test_orphan_summary_is_reported(manager, db_path):
+    _save(manager)
+    # 外部キーを有効にしていない接続（sqlite3 コマンド等）からの書き込みで残る集計行
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO calculation_summaries (calculation_id, total_items) VALUES (999, 3)")
+    conn.commit()
+    conn.close()
+
+    assert verify_summaries(manager) == 1
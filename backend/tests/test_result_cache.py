@@ -0,0 +1,36 @@
+"""計算結果キャッシュ: ヒット時の復元と上限を超える結果の扱い"""
+
+import pandas as pd
+
+import result_cache
+from result_cache import ResultCache
+
+
+def _frame(rows):
+    return pd.DataFrame({'box_id': range(rows), 'material': ['K18'] * rows})
+
+
+def test_second_lookup_is_a_memory_hit():
+    cache = ResultCache(max_bytes=1024 * 1024, disk_dir=None)
+
+    first = cache.get_or_compute('key', lambda: _frame(3))
+    second = cache.get_or_compute('key', lambda: None)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert second is not first
+    assert cache.stats()['memory_hits'] == 1
+
+
+def test_oversized_result_is_returned_without_pickling(monkeypatch):
+    cache = ResultCache(max_bytes=1024, disk_dir=None)
+    pickled = []
+    dumps = result_cache.pickle.dumps
+    monkeypatch.setattr(result_cache.pickle, 'dumps', lambda obj, **kwargs: pickled.append(obj) or dumps(obj, **kwargs))
+
+    big = cache.get_or_compute('big', lambda: _frame(1000))
+    small = cache.get_or_compute('small', lambda: _frame(2))
+
+    assert len(big) == 1000
+    assert pickled == [small]
+    stats = cache.stats()
+    assert (stats['misses'], stats['entries']) == (2, 1)
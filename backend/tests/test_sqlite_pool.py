@@ -0,0 +1,82 @@
+"""SQLite 接続プール: 入れ子の取得と接続の再利用"""
+
+import threading
+
+import pytest
+
+from sqlite_pool import SQLitePool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / 'pool.db'))
+    conn = pool.connection()
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    conn.commit()
+    conn.close()
+    yield pool
+    pool.close_all()
+
+
+def _count(pool):
+    conn = pool.connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_nested_close_keeps_outer_transaction(pool):
+    outer = pool.connection()
+    outer.execute("INSERT INTO t VALUES (1)")
+
+    inner = pool.connection()
+    inner.execute("SELECT 1").fetchone()
+    inner.close()
+
+    assert outer.in_transaction
+    outer.commit()
+    outer.close()
+    assert _count(pool) == 1
+
+
+def test_outermost_close_rolls_back(pool):
+    conn = pool.connection()
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+    conn.close()
+
+    assert _count(pool) == 0
+
+
+def test_checkout_left_open_by_finished_thread_is_reclaimed(pool):
+    leaked = []
+
+    def work():
+        conn = pool.connection()
+        conn.execute("INSERT INTO t VALUES (1)")
+        leaked.append(conn)
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+
+    assert _count(pool) == 0
+    assert len(pool._connections) == 1
+
+
+def test_connections_are_reused_by_new_threads(pool):
+    seen = []
+
+    def work():
+        conn = pool.connection()
+        seen.append(id(conn._conn))
+        conn.close()
+
+    for _ in range(5):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    assert len(set(seen)) == 1
+    assert len(pool._connections) == 1
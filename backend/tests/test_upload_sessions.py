@@ -0,0 +1,38 @@
+"""アップロードセッション: 合計バイト数の上限"""
+
+import pandas as pd
+
+import upload_sessions
+from upload_sessions import UploadSessionStore
+
+
+def _items(rows):
+    return pd.DataFrame({
+        'box_id': range(rows),
+        'box_no': 1,
+        'material': 'K18',
+        'misc': '',
+        'weight': '1.0g',
+        'brand_name': ''
+    })
+
+
+def test_oldest_sessions_are_dropped_over_byte_budget(monkeypatch):
+    store = UploadSessionStore()
+    first = store.create(1, _items(1000))
+    monkeypatch.setattr(upload_sessions, 'UPLOAD_SESSION_MAX_BYTES', first.size * 2.5)
+
+    second = store.create(1, _items(1000))
+    third = store.create(1, _items(1000))
+
+    assert store.get(first.token, 1) is None
+    assert store.get(second.token, 1) is second
+    assert store.get(third.token, 1) is third
+
+
+def test_session_larger_than_budget_is_not_kept(monkeypatch):
+    monkeypatch.setattr(upload_sessions, 'UPLOAD_SESSION_MAX_BYTES', 1024)
+    store = UploadSessionStore()
+
+    assert store.create(1, _items(1000)) is None
+    assert store._sessions == {}
@@ -0,0 +1,193 @@
+"""
+アップロードセッション管理モジュール
+- check-weights で解析した CSV をサーバー側に保持し、トークンで参照できるようにする
+- 以降の計算リクエストは修正行（パッチ）だけを送ればよい
+- データは SpooledTemporaryFile に保存（小さければメモリ、大きければディスク）
+- 全セッションの合計バイト数に上限を設け、超えたら古いものから破棄する
+- 同じ相場表で再計算する場合はパッチを当てた行だけを再計算する
+"""
+
+import os
+import pickle
+import secrets
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from material_resolver import material_resolver
+from pricing_engine import RESULT_COLUMNS, assign_result_columns, compute_item_values, prepare_item_df
+
+# セッションの有効期限（最終アクセスからの秒数）
+UPLOAD_SESSION_TTL_SECONDS = int(os.environ.get('UPLOAD_SESSION_TTL_SECONDS', 30 * 60))
+# 1セッションあたりメモリに保持する上限（超えるとディスクに書き出す）
+UPLOAD_SESSION_SPOOL_BYTES = int(os.environ.get('UPLOAD_SESSION_SPOOL_BYTES', 1024 * 1024))
+# 全セッションの合計バイト数の上限（Cloud Run の /tmp はメモリ上にあるため、ディスク分も含める）
+UPLOAD_SESSION_MAX_BYTES = int(os.environ.get('UPLOAD_SESSION_MAX_BYTES', 64 * 1024 * 1024))
+
+
+class PatchError(ValueError):
+    """パッチの内容が不正"""
+
+
+def price_table_key(price_table: Dict[str, float]) -> int:
+    """単価辞書の同一性判定用キー"""
+    return hash(tuple(sorted(price_table.items())))
+
+
+class UploadSession:
+    """1件のアップロード（アイテムデータと直近の計算結果）"""
+
+    def __init__(self, token: str, user_id: int, item_df: pd.DataFrame):
+        self.token = token
+        self.user_id = user_id
+        self.row_count = len(item_df)
+        self.lock = threading.Lock()
+        self.touch()
+        self._spool = None
+        self.size = 0
+        self._write({
+            'items': prepare_item_df(item_df.copy()),
+            'values': None,
+            'table_key': None,
+            'snapshot_mtime': None
+        })
+
+    def touch(self):
+        self.expires_at = time.monotonic() + UPLOAD_SESSION_TTL_SECONDS
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def _write(self, state: Dict):
+        spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SESSION_SPOOL_BYTES)
+        pickle.dump(state, spool, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._spool is not None:
+            self._spool.close()
+        self._spool = spool
+        self.size = spool.tell()
+
+    def _read(self) -> Dict:
+        self._spool.seek(0)
+        return pickle.load(self._spool)
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    @staticmethod
+    def _apply_patches(items: pd.DataFrame, patches: List[Dict]) -> List[int]:
+        """パッチを適用し、変更された行のインデックスを返す"""
+        patched = []
+        for patch in patches:
+            index = patch.get('index')
+            if not isinstance(index, int) or index not in items.index:
+                raise PatchError(f"無効な行インデックスです: {index}")
+
+            for col, value in patch.items():
+                if col == 'index':
+                    continue
+                if col not in items.columns:
+                    items[col] = None
+                if items[col].dtype != object:
+                    items[col] = items[col].astype(object)
+                items.at[index, col] = value
+            patched.append(index)
+        return patched
+
+    def price(self, patches: List[Dict], price_table: Dict[str, float]) -> pd.DataFrame:
+        """
+        パッチを適用して価格計算（結果は並べ替え前の DataFrame）
+
+        前回と同じ相場表・エイリアス表であれば、パッチを当てた行だけを再計算する
+        """
+        with self.lock:
+            state = self._read()
+            items = state['items']
+            patched = self._apply_patches(items, patches or [])
+            if patched:
+                items = prepare_item_df(items)
+
+            snapshot = material_resolver.snapshot()
+            key = price_table_key(price_table)
+            values = state['values']
+
+            if values is not None and state['table_key'] == key and state['snapshot_mtime'] == snapshot.mtime:
+                if patched:
+                    positions = items.index.get_indexer(patched)
+                    patched_values = compute_item_values(items.iloc[positions], price_table, snapshot)
+                    for col in RESULT_COLUMNS:
+                        values[col][positions] = patched_values[col]
+            else:
+                values = compute_item_values(items, price_table, snapshot)
+
+            self._write({
+                'items': items,
+                'values': values,
+                'table_key': key,
+                'snapshot_mtime': snapshot.mtime
+            })
+            self.touch()
+
+        return assign_result_columns(items, {col: np.array(values[col]) for col in RESULT_COLUMNS})
+
+
+class UploadSessionStore:
+    """アップロードセッションの保持と有効期限管理"""
+
+    def __init__(self):
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+
+    def _sweep(self):
+        """期限切れのセッションを破棄（ロック取得済みで呼ぶ）"""
+        for token in [token for token, session in self._sessions.items() if session.expired]:
+            self._sessions.pop(token).close()
+
+        # 再計算で結果が加わるとサイズが増えるため、毎回合計し直す
+        total = sum(session.size for session in self._sessions.values())
+        while total > UPLOAD_SESSION_MAX_BYTES and self._sessions:
+            oldest = min(self._sessions.values(), key=lambda session: session.expires_at)
+            self._sessions.pop(oldest.token).close()
+            total -= oldest.size
+
+    def create(self, user_id: int, item_df: pd.DataFrame) -> Optional[UploadSession]:
+        """セッションを作成（1件で合計の上限を超える場合は保持せず None）"""
+        session = UploadSession(secrets.token_urlsafe(24), user_id, item_df)
+        if session.size > UPLOAD_SESSION_MAX_BYTES:
+            session.close()
+            print(f"⚠️ アップロードセッションの上限を超えるため保持しません: {session.size:,}バイト")
+            return None
+
+        with self._lock:
+            self._sessions[session.token] = session
+            self._sweep()
+        return session
+
+    def get(self, token: str, user_id: int) -> Optional[UploadSession]:
+        """セッションを取得（期限切れ・他ユーザーのものは None）"""
+        with self._lock:
+            self._sweep()
+            session = self._sessions.get(token)
+
+        if session is None or session.user_id != user_id:
+            return None
+        return session
+
+    def delete(self, token: str, user_id: int) -> bool:
+        """セッションを破棄"""
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None or session.user_id != user_id:
+                return False
+            self._sessions.pop(token).close()
+            return True
+
+
+# シングルトンインスタンス
+upload_session_store = UploadSessionStore()
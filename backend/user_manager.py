@@ -9,6 +9,8 @@ import os
 from datetime import datetime
 from typing import Optional, Dict, List
 
+from sqlite_pool import get_connection
+
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'users.db')
 
 class UserManager:
@@ -25,10 +27,8 @@ class UserManager:
             self._initialize_database()
     
     def _get_connection(self):
-        """データベース接続を取得"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # 辞書形式でアクセス可能
-        return conn
+        """データベース接続を取得（スレッドごとのプール接続。close() でプールに返却）"""
+        return get_connection(self.db_path)
     
     def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
         """
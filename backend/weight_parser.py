@@ -0,0 +1,77 @@
+"""
+重量テキスト解析モジュール
+- calculate_items / check_weights / CalculationManagerV3 / 移行スクリプトで共通利用
+- 1件ずつ解析するスカラーAPIと、列をまとめて解析する Series API を提供
+- g 以外の単位（kg, mg, 匁）もグラムに換算する
+"""
+
+import re
+import unicodedata
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+# 単位ごとのグラム換算係数（1匁 = 3.75g）
+UNIT_TO_GRAMS = {
+    'kg': 1000.0,
+    'mg': 0.001,
+    'g': 1.0,
+    '匁': 3.75,
+    'もんめ': 3.75,
+}
+
+# 最初に現れる単位より前を数値部分とみなす（単位が無ければ全体）
+_UNIT_PATTERN = re.compile(r'(kg|mg|g|匁|もんめ)')
+_SPLIT_PATTERN = r'^(?P<number>[\s\S]*?)(?P<unit>kg|mg|g|匁|もんめ)'
+_NON_NUMERIC_PATTERN = re.compile(r'[^0-9.]')
+
+
+def parse_weight(weight_text: Any) -> Optional[float]:
+    """
+    重量テキストをグラムに変換（"11.3g", "1.2kg", "3匁" など）
+
+    Returns:
+        グラム数、空や解析できない値は None
+    """
+    if weight_text is None:
+        return None
+    if isinstance(weight_text, (int, float, np.number)):
+        return None if np.isnan(weight_text) else float(weight_text)
+
+    text = unicodedata.normalize('NFKC', str(weight_text))
+    match = _UNIT_PATTERN.search(text)
+    if match:
+        number_part = text[:match.start()]
+        factor = UNIT_TO_GRAMS[match.group(1)]
+    else:
+        number_part = text
+        factor = 1.0
+
+    cleaned = _NON_NUMERIC_PATTERN.sub('', number_part)
+    try:
+        return float(cleaned) * factor
+    except ValueError:
+        return None
+
+
+def parse_weights(weights: pd.Series) -> pd.Series:
+    """
+    重量テキスト列をまとめてグラムに変換
+
+    Returns:
+        元と同じインデックスの float 列（空や解析できない値は NaN）
+    """
+    if pd.api.types.is_numeric_dtype(weights):
+        # すでに数値列（CSV の重量がすべて数値）の場合はそのまま
+        return weights.astype(float)
+
+    text = weights.where(weights.notna(), '').astype(str).str.normalize('NFKC')
+    parts = text.str.extract(_SPLIT_PATTERN)
+
+    has_unit = parts['unit'].notna()
+    number_part = parts['number'].where(has_unit, text)
+    factor = parts['unit'].map(UNIT_TO_GRAMS).where(has_unit, 1.0).astype(float)
+
+    cleaned = number_part.str.replace(_NON_NUMERIC_PATTERN.pattern, '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce').astype(float) * factor